@@ -0,0 +1,83 @@
+r"""Throughput of the ratio-estimator trainer in mixed precision and with
+the channels-last memory format.
+
+Trains a ResNet ratio estimator on the 2-dimensional SpatialSIR lattices
+(3x100x100) in fp32, bf16, fp32 with channels-last and bf16 with
+channels-last, and reports the number of training samples per second.
+"""
+
+import argparse
+import time
+import torch
+
+from hypothesis.auto.training import LikelihoodToEvidenceRatioEstimatorTrainer as Trainer
+from hypothesis.benchmark.spatialsir import Prior
+from hypothesis.benchmark.spatialsir import Simulator
+from hypothesis.nn.amortized_ratio_estimation import LikelihoodToEvidenceRatioEstimatorResNet as RatioEstimator
+from hypothesis.util.data import SimulationTensorDataset
+
+
+
+CONFIGURATIONS = [
+    ("fp32", None, False),
+    ("bf16", "bf16", False),
+    ("fp32 + channels-last", None, True),
+    ("bf16 + channels-last", "bf16", True)]
+
+
+def main(arguments):
+    dataset = allocate_dataset(arguments.samples)
+    print("{:<24}{:>16}".format("Configuration", "Samples / s"))
+    for name, precision, channels_last in CONFIGURATIONS:
+        throughput = measure(arguments, dataset, precision, channels_last)
+        print("{:<24}{:>16.1f}".format(name, throughput))
+
+
+def measure(arguments, dataset, precision, channels_last):
+    torch.manual_seed(0)
+    estimator = RatioEstimator(
+        depth=arguments.depth,
+        shape_inputs=(2,),
+        shape_outputs=(100, 100),
+        trunk_layers=(128, 128))
+    optimizer = torch.optim.Adam(estimator.parameters())
+    trainer = Trainer(
+        batch_size=arguments.batch_size,
+        channels_last=channels_last,
+        dataset_train=dataset,
+        epochs=1,
+        estimator=estimator,
+        optimizer=optimizer,
+        precision=precision)
+    # Warm up, such that the kernels are selected before timing.
+    trainer.train()
+    start = time.time()
+    trainer.train()
+    duration = time.time() - start
+
+    return (len(dataset) // arguments.batch_size) * arguments.batch_size / duration
+
+
+@torch.no_grad()
+def allocate_dataset(n):
+    prior = Prior()
+    simulator = Simulator(batched=True)
+    inputs = prior.sample(torch.Size([n]))
+    outputs = simulator(inputs).float()
+
+    return SimulationTensorDataset(inputs, outputs)
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser("Mixed-precision and channels-last throughput benchmark on SpatialSIR")
+    parser.add_argument("--batch-size", type=int, default=32, help="Batch-size of the stochastic optimization (default: 32).")
+    parser.add_argument("--depth", type=int, default=18, help="Depth of the ResNet head (default: 18).")
+    parser.add_argument("--samples", type=int, default=256, help="Number of simulated training samples (default: 256).")
+    arguments, _ = parser.parse_known_args()
+
+    return arguments
+
+
+if __name__ == "__main__":
+    arguments = parse_arguments()
+    main(arguments)
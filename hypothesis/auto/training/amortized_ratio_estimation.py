@@ -1,18 +1,51 @@
+import copy
 import hypothesis
+import itertools
 import numpy as np
 import os
 import re
+import threading
 import torch
 
 from .base import BaseTrainer
 from hypothesis.nn.amortized_ratio_estimation import BaseCriterion
 from hypothesis.nn.amortized_ratio_estimation import ConservativeLikelihoodToEvidenceCriterion
 from hypothesis.nn.amortized_ratio_estimation import LikelihoodToEvidenceCriterion
+from hypothesis.nn.util import channels_last as convert_channels_last
 from hypothesis.summary import TrainingSummary as Summary
+from hypothesis.util.data import DeviceDataLoader
+from hypothesis.util.seeding import get_rng_state
+from hypothesis.util.seeding import set_rng_state
+from torch.utils.data import IterableDataset
 
 
 
 class BaseAmortizedRatioEstimatorTrainer(BaseTrainer):
+    r"""Base trainer of amortized ratio estimators.
+
+    Setting ``precision`` to ``"bf16"`` or ``"fp16"`` evaluates the
+    estimator in mixed precision (autocast), the losses remain in single
+    precision. Half precision (``"fp16"``) scales the loss to prevent the
+    gradients from underflowing. Setting ``channels_last`` converts the
+    2-dimensional convolutional heads to the channels-last memory format.
+
+    Setting ``checkpoint`` to a path stores the training state after every
+    epoch, and every ``checkpoint_every`` batches if specified. The state
+    is copied to the CPU and written in a background thread, through a
+    temporary file which atomically replaces the previous checkpoint. The
+    loss histories are appended to ``<checkpoint>.losses_train`` and
+    ``<checkpoint>.losses_test``, and the best model is stored in
+    ``<checkpoint>.best-<version>`` whenever it changes, such that a
+    checkpoint only writes what changed since the previous one. An
+    existing checkpoint is loaded on construction and ``fit`` resumes at
+    the stored epoch and batch, with the optimizer, the schedulers, the
+    gradient scaler and the random generators restored. The batches of an
+    interrupted epoch are reproduced by fast-forwarding the data loader.
+    """
+
+    PRECISIONS = {
+        "bf16": torch.bfloat16,
+        "fp16": torch.float16}
 
     def __init__(self,
         criterion,
@@ -22,14 +55,19 @@ class BaseAmortizedRatioEstimatorTrainer(BaseTrainer):
         dataset_train,
         accelerator=hypothesis.accelerator,
         batch_size=hypothesis.default.batch_size,
+        channels_last=False,
         checkpoint=None,
+        checkpoint_every=None,
         dataset_test=None,
         epochs=hypothesis.default.epochs,
         identifier=None,
         lr_scheduler_epoch=None,
         lr_scheduler_update=None,
+        precision=None,
         shuffle=True,
         workers=hypothesis.default.dataloader_workers):
+        if precision is not None and precision not in self.PRECISIONS:
+            raise ValueError("Unknown precision", precision, ", available options: bf16, fp16.")
         super(BaseAmortizedRatioEstimatorTrainer, self).__init__(
             batch_size=batch_size,
             checkpoint=checkpoint,
@@ -52,12 +90,40 @@ class BaseAmortizedRatioEstimatorTrainer(BaseTrainer):
         self.lr_scheduler_epoch = lr_scheduler_epoch
         self.lr_scheduler_update = lr_scheduler_update
         self.optimizer = optimizer
+        self.precision = precision
         self.best_epoch = None
         self.best_loss = float("infinity")
         self.best_model = None
         # Move estimator and criterion to the specified accelerator.
         self.estimator = self.estimator.to(self.accelerator)
         self.criterion = self.criterion.to(self.accelerator)
+        if channels_last:
+            convert_channels_last(self.estimator)
+        self.scaler = self._allocate_grad_scaler()
+        # Checkpointing state
+        self.checkpoint_every = checkpoint_every
+        self._batch = 0
+        self._checkpoint_best_model = None
+        self._checkpoint_best_version = None
+        self._checkpoint_error = None
+        self._checkpoint_losses = {"losses_train": 0, "losses_test": 0}
+        self._checkpoint_thread = None
+        self._epoch_rng_state = None
+        # Load the previously saved state.
+        self._checkpoint_load()
+
+    def _allocate_grad_scaler(self):
+        enabled = self.precision == "fp16"
+        if hasattr(torch.amp, "GradScaler"):
+            return torch.amp.GradScaler(torch.device(self.accelerator).type, enabled=enabled)
+
+        return torch.cuda.amp.GradScaler(enabled=enabled)
+
+    def _autocast(self):
+        return torch.autocast(
+            device_type=torch.device(self.accelerator).type,
+            dtype=self.PRECISIONS.get(self.precision),
+            enabled=self.precision is not None)
 
     def _register_events(self):
         self.register_event("batch_complete")
@@ -71,30 +137,127 @@ class BaseAmortizedRatioEstimatorTrainer(BaseTrainer):
     def _valid_checkpoint_path_and_exists(self):
         return self._valid_checkpoint_path() and os.path.exists(self.checkpoint_path)
 
+    def _checkpoint_best_path(self, version):
+        return "{}.best-{}".format(self.checkpoint_path, version)
+
+    def _checkpoint_losses_path(self, key):
+        return "{}.{}".format(self.checkpoint_path, key)
+
     @torch.no_grad()
+    def _checkpoint_state(self):
+        state = {}
+        state["accelerator"] = self.accelerator
+        state["batch"] = self._batch
+        state["current_epoch"] = self.current_epoch
+        state["estimator"] = self._cpu_estimator_state_dict()
+        state["epochs_remaining"] = self.epochs_remaining
+        state["epochs"] = self.epochs
+        if self.lr_scheduler_update is not None:
+            state["lr_scheduler_update"] = _cpu_copy(self.lr_scheduler_update.state_dict())
+        if self.lr_scheduler_epoch is not None:
+            state["lr_scheduler_epoch"] = _cpu_copy(self.lr_scheduler_epoch.state_dict())
+        state["optimizer"] = _cpu_copy(self.optimizer.state_dict())
+        state["precision"] = self.precision
+        state["rng"] = get_rng_state()
+        # The batches of an interrupted epoch are reproduced from the
+        # random state at the start of the epoch.
+        if self._batch > 0:
+            state["rng_epoch"] = self._epoch_rng_state
+        state["scaler"] = self.scaler.state_dict()
+        state["best_epoch"] = self.best_epoch
+        state["best_loss"] = self.best_loss
+
+        return state
+
+    def _checkpoint_write(self, state, losses, best_model, stale_version):
+        try:
+            for key, (offset, values) in losses.items():
+                _write_losses(self._checkpoint_losses_path(key), offset, values)
+            if best_model is not None:
+                _save_atomically(best_model, self._checkpoint_best_path(state["best_model"]))
+            _save_atomically(state, self.checkpoint_path)
+            # The previous best model is no longer referenced.
+            if stale_version is not None:
+                os.remove(self._checkpoint_best_path(stale_version))
+        except BaseException as e:
+            self._checkpoint_error = e
+
+    def _checkpoint_wait(self):
+        if self._checkpoint_thread is not None:
+            self._checkpoint_thread.join()
+            self._checkpoint_thread = None
+        # Surface the errors of the background write.
+        error, self._checkpoint_error = self._checkpoint_error, None
+        if error is not None:
+            raise error
+
     def _checkpoint_store(self):
         if self._valid_checkpoint_path():
-            state = {}
-            state["accelerator"] = self.accelerator
-            state["current_epoch"] = self.current_epoch
-            state["estimator"] = self._cpu_estimator_state_dict()
-            state["epochs_remaining"] = self.epochs_remaining
-            state["epochs"] = self.epochs
-            state["losses_test"] = self.losses_test
-            state["losses_train"] = self.losses_train
-            if self.lr_scheduler_update is not None:
-                state["lr_scheduler_update"] = self.lr_scheduler_update.state_dict()
-            if self.lr_scheduler_epoch is not None:
-                state["lr_scheduler_epoch"] = self.lr_scheduler_epoch.state_dict()
-            state["optimizer"] = self.optimizer.state_dict()
-            state["best_epoch"] = self.best_epoch
-            state["best_loss"] = self.best_loss
-            state["best_model"] = self.best_model
-            torch.save(state, self.checkpoint_path)
+            self._checkpoint_wait()
+            state = self._checkpoint_state()
+            # Only the new entries of the loss histories are written.
+            losses = {}
+            for key, offset in self._checkpoint_losses.items():
+                history = getattr(self, key)
+                losses[key] = (offset, history[offset:])
+                state[key] = len(history)
+                self._checkpoint_losses[key] = len(history)
+            # The best model is only written when it changed.
+            best_model = None
+            stale_version = None
+            if self.best_model is not self._checkpoint_best_model:
+                best_model = self.best_model
+                stale_version = self._checkpoint_best_version
+                if stale_version is None:
+                    self._checkpoint_best_version = 0
+                else:
+                    self._checkpoint_best_version = stale_version + 1
+                self._checkpoint_best_model = best_model
+            state["best_model"] = self._checkpoint_best_version
+            self._checkpoint_thread = threading.Thread(
+                target=self._checkpoint_write, args=(state, losses, best_model, stale_version))
+            self._checkpoint_thread.start()
+
+    def _checkpoint_remove(self):
+        paths = [self.checkpoint_path]
+        paths.extend(self._checkpoint_losses_path(key) for key in self._checkpoint_losses)
+        if self._checkpoint_best_version is not None:
+            paths.append(self._checkpoint_best_path(self._checkpoint_best_version))
+        for path in paths:
+            if os.path.exists(path):
+                os.remove(path)
 
     def _checkpoint_load(self):
         if self._valid_checkpoint_path_and_exists():
-            raise NotImplementedError
+            state = torch.load(self.checkpoint_path, map_location="cpu", weights_only=False)
+            estimator = self.estimator
+            if isinstance(estimator, torch.nn.DataParallel):
+                estimator = estimator.module
+            estimator.load_state_dict(state["estimator"])
+            self.optimizer.load_state_dict(state["optimizer"])
+            if self.lr_scheduler_update is not None and "lr_scheduler_update" in state:
+                self.lr_scheduler_update.load_state_dict(state["lr_scheduler_update"])
+            if self.lr_scheduler_epoch is not None and "lr_scheduler_epoch" in state:
+                self.lr_scheduler_epoch.load_state_dict(state["lr_scheduler_epoch"])
+            if state["precision"] == self.precision:
+                self.scaler.load_state_dict(state["scaler"])
+            # The number of epochs can be extended when resuming.
+            completed_epochs = state["epochs"] - state["epochs_remaining"]
+            self.epochs_remaining = self.epochs - completed_epochs
+            self.current_epoch = state["current_epoch"]
+            for key in self._checkpoint_losses:
+                self._checkpoint_losses[key] = state[key]
+                setattr(self, key, _read_losses(self._checkpoint_losses_path(key), state[key]))
+            self.best_epoch = state["best_epoch"]
+            self.best_loss = state["best_loss"]
+            version = state["best_model"]
+            if version is not None:
+                self.best_model = torch.load(self._checkpoint_best_path(version), map_location="cpu")
+            self._checkpoint_best_model = self.best_model
+            self._checkpoint_best_version = version
+            self._batch = state["batch"]
+            self._epoch_rng_state = state.get("rng_epoch")
+            set_rng_state(state["rng"])
 
     def _summarize(self):
         return Summary(
@@ -106,25 +269,42 @@ class BaseAmortizedRatioEstimatorTrainer(BaseTrainer):
             losses_train=np.array(self.losses_train).reshape(-1),
             losses_test=np.array(self.losses_test).reshape(-1))
 
+    def _allocate_data_loader(self, dataset):
+        # Small in-memory datasets are moved to the accelerator once.
+        tensors = getattr(dataset, "tensors", None)
+        if tensors is None:
+            return super(BaseAmortizedRatioEstimatorTrainer, self)._allocate_data_loader(dataset)
+        key = id(dataset)
+        if key not in self._data_loaders:
+            nbytes = sum(tensor.element_size() * tensor.numel() for tensor in tensors)
+            if nbytes >= hypothesis.default.device_dataset_threshold:
+                return super(BaseAmortizedRatioEstimatorTrainer, self)._allocate_data_loader(dataset)
+            self._data_loaders[key] = DeviceDataLoader(tensors,
+                batch_size=self.batch_size,
+                device=self.accelerator,
+                drop_last=True,
+                shuffle=self.shuffle)
+
+        return self._data_loaders[key]
+
     @torch.no_grad()
     def _cpu_estimator_state_dict(self):
         # Check if we're training a Data Parallel model.
-        self.estimator = self.estimator.cpu()
         if isinstance(self.estimator, torch.nn.DataParallel):
             state_dict = self.estimator.module.state_dict()
         else:
             state_dict = self.estimator.state_dict()
-        self.estimator = self.estimator.to(hypothesis.accelerator)
 
-        return state_dict
+        # Copy, such that the state is not modified by further training.
+        return _cpu_copy(state_dict)
 
     @torch.no_grad()
     def checkpoint(self):
         self._checkpoint_store()
 
     def fit(self):
-        # Training procedure
-        for epoch in range(self.epochs):
+        # Training procedure, resumed from the last checkpoint.
+        for epoch in range(self.epochs - self.epochs_remaining, self.epochs):
             self.current_epoch = epoch + 1
             self.call_event(self.events.epoch_start)
             self.train()
@@ -139,9 +319,10 @@ class BaseAmortizedRatioEstimatorTrainer(BaseTrainer):
             self.epochs_remaining -= 1
             self.checkpoint()
             self.call_event(self.events.epoch_complete)
+        self._checkpoint_wait()
         # Remove the checkpoint.
-        if self._valid_checkpoint_path_and_exists():
-            os.remove(self.checkpoint_path)
+        if self._valid_checkpoint_path():
+            self._checkpoint_remove()
 
         return self._summarize()
 
@@ -151,10 +332,11 @@ class BaseAmortizedRatioEstimatorTrainer(BaseTrainer):
         loader = self._allocate_data_loader(self.dataset_test)
         total_loss = 0.0
         for batch in loader:
-            loss = self.feeder(
-                accelerator=self.accelerator,
-                batch=batch,
-                criterion=self.criterion)
+            with self._autocast():
+                loss = self.feeder(
+                    accelerator=self.accelerator,
+                    batch=batch,
+                    criterion=self.criterion)
             total_loss += loss.item()
         total_loss /= len(loader)
         self.losses_test.append(total_loss)
@@ -168,21 +350,49 @@ class BaseAmortizedRatioEstimatorTrainer(BaseTrainer):
 
     def train(self):
         self.estimator.train()
+        start = self._batch
+        if start > 0:
+            # Rewind the random generators to the start of the interrupted epoch.
+            rng_state = get_rng_state()
+            set_rng_state(self._epoch_rng_state)
+        else:
+            self._epoch_rng_state = get_rng_state()
+        # Datasets which are resampled every epoch.
+        if hasattr(self.dataset_train, "set_epoch"):
+            self.dataset_train.set_epoch(self.current_epoch)
         loader = self._allocate_data_loader(self.dataset_train)
-        for index, batch in enumerate(loader):
+        num_batches = len(loader)
+        batches = iter(loader)
+        if start > 0:
+            # Iterable datasets produce new batches, only the remaining
+            # batches of the epoch are drawn. Otherwise, the processed
+            # batches are skipped to reproduce the order of the epoch.
+            if not isinstance(self.dataset_train, IterableDataset):
+                for _ in itertools.islice(batches, start):
+                    pass
+            set_rng_state(rng_state)
+        for index, batch in enumerate(batches, start):
+            if index >= num_batches:
+                break
             self.call_event(self.events.batch_start)
-            loss = self.feeder(
-                accelerator=self.accelerator,
-                batch=batch,
-                criterion=self.criterion)
+            with self._autocast():
+                loss = self.feeder(
+                    accelerator=self.accelerator,
+                    batch=batch,
+                    criterion=self.criterion)
             self.optimizer.zero_grad()
-            loss.backward()
-            self.optimizer.step()
+            self.scaler.scale(loss).backward()
+            self.scaler.step(self.optimizer)
+            self.scaler.update()
             if self.lr_scheduler_update is not None:
                 self.lr_scheduler_update.step()
             loss = loss.item()
             self.losses_train.append(loss)
+            self._batch = index + 1
             self.call_event(self.events.batch_complete, index=index, loss=loss)
+            if self.checkpoint_every is not None and self._batch % self.checkpoint_every == 0:
+                self.checkpoint()
+        self._batch = 0
 
 
 
@@ -194,13 +404,16 @@ class LikelihoodToEvidenceRatioEstimatorTrainer(BaseAmortizedRatioEstimatorTrain
         dataset_train,
         accelerator=hypothesis.accelerator,
         batch_size=hypothesis.default.batch_size,
+        channels_last=False,
         criterion=None,
         checkpoint=None,
+        checkpoint_every=None,
         dataset_test=None,
         epochs=hypothesis.default.epochs,
         identifier=None,
         lr_scheduler_epoch=None,
         lr_scheduler_update=None,
+        precision=None,
         workers=hypothesis.default.dataloader_workers):
         if criterion is None:
             criterion = LikelihoodToEvidenceCriterion(
@@ -210,7 +423,9 @@ class LikelihoodToEvidenceRatioEstimatorTrainer(BaseAmortizedRatioEstimatorTrain
         super(LikelihoodToEvidenceRatioEstimatorTrainer, self).__init__(
             accelerator=accelerator,
             batch_size=batch_size,
+            channels_last=channels_last,
             checkpoint=checkpoint,
+            checkpoint_every=checkpoint_every,
             criterion=criterion,
             dataset_test=dataset_test,
             dataset_train=dataset_train,
@@ -221,6 +436,7 @@ class LikelihoodToEvidenceRatioEstimatorTrainer(BaseAmortizedRatioEstimatorTrain
             lr_scheduler_epoch=lr_scheduler_epoch,
             lr_scheduler_update=lr_scheduler_update,
             optimizer=optimizer,
+            precision=precision,
             workers=workers)
 
     @staticmethod
@@ -258,17 +474,22 @@ def create_trainer(criterion, denominator):
             criterion,
             accelerator=hypothesis.accelerator,
             batch_size=hypothesis.default.batch_size,
+            channels_last=False,
             checkpoint=None,
+            checkpoint_every=None,
             dataset_test=None,
             epochs=hypothesis.default.epochs,
             lr_scheduler=None,
             identifier=None,
+            precision=None,
             shuffle=True,
             workers=hypothesis.default.dataloader_workers):
             super(Trainer, self).__init__(
                 accelerator=accelerator,
                 batch_size=batch_size,
+                channels_last=channels_last,
                 checkpoint=checkpoint,
+                checkpoint_every=checkpoint_every,
                 criterion=criterion,
                 dataset_test=dataset_test,
                 dataset_train=dataset_train,
@@ -278,7 +499,47 @@ def create_trainer(criterion, denominator):
                 identifier=identifier,
                 lr_scheduler_epoch=lr_scheduler,
                 optimizer=optimizer,
+                precision=precision,
                 shuffle=shuffle,
                 workers=workers)
 
     return Trainer
+
+
+
+def _cpu_copy(value):
+    if isinstance(value, torch.Tensor):
+        return value.detach().to("cpu", copy=True)
+    elif isinstance(value, dict):
+        return type(value)((key, _cpu_copy(item)) for key, item in value.items())
+    elif type(value) in (list, tuple):
+        return type(value)(_cpu_copy(item) for item in value)
+
+    return copy.deepcopy(value)
+
+
+def _read_losses(path, size):
+    if size == 0:
+        return []
+
+    return np.fromfile(path, dtype=np.float64, count=size).tolist()
+
+
+def _write_losses(path, offset, values):
+    # Entries beyond the offset were not committed by a checkpoint.
+    mode = "r+b" if os.path.exists(path) else "wb"
+    with open(path, mode) as f:
+        f.seek(offset * np.dtype(np.float64).itemsize)
+        f.write(np.asarray(values, dtype=np.float64).tobytes())
+        f.truncate()
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def _save_atomically(obj, path):
+    temporary_path = path + ".tmp"
+    with open(temporary_path, "wb") as f:
+        torch.save(obj, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temporary_path, path)
@@ -1,7 +1,10 @@
 import hypothesis
 
 from hypothesis.engine import Procedure
+from hypothesis.util.data import BatchIndexSampler
+from hypothesis.util.seeding import seed_dataloader_worker
 from torch.utils.data import DataLoader
+from torch.utils.data import IterableDataset
 
 
 
@@ -22,8 +25,9 @@ class BaseTrainer(Procedure):
         self.epochs = epochs
         self.identifier = identifier
         self.shuffle = shuffle
-        # Load the previously saved state.
-        self._checkpoint_load()
+        self._data_loaders = {}
+        # Subclasses load the previously saved state (`_checkpoint_load`)
+        # once their own state has been allocated.
 
     def _checkpoint_store(self):
         raise NotImplementedError
@@ -32,12 +36,41 @@ class BaseTrainer(Procedure):
         raise NotImplementedError
 
     def _allocate_data_loader(self, dataset):
+        # Iterable datasets produce complete batches themselves. The loader
+        # (and its workers) is kept alive, such that the state of the
+        # dataset persists across epochs.
+        if isinstance(dataset, IterableDataset):
+            key = id(dataset)
+            if key not in self._data_loaders:
+                self._data_loaders[key] = DataLoader(dataset,
+                    batch_size=None,
+                    num_workers=self.dataloader_workers,
+                    persistent_workers=self.dataloader_workers > 0,
+                    pin_memory=True,
+                    worker_init_fn=seed_dataloader_worker)
+            return self._data_loaders[key]
+        # Check if the dataset is able to retrieve complete batches.
+        if hasattr(dataset, "get_batch"):
+            # Datasets stored in blocks are shuffled block-wise.
+            sampler = BatchIndexSampler(len(dataset),
+                batch_size=self.batch_size,
+                block_size=getattr(dataset, "block_size", None),
+                drop_last=True,
+                shuffle=self.shuffle)
+            return DataLoader(dataset,
+                batch_size=None,
+                num_workers=self.dataloader_workers,
+                pin_memory=True,
+                sampler=sampler,
+                worker_init_fn=seed_dataloader_worker)
+
         return DataLoader(dataset,
             batch_size=self.batch_size,
             drop_last=True,
             num_workers=self.dataloader_workers,
             pin_memory=True,
-            shuffle=self.shuffle)
+            shuffle=self.shuffle,
+            worker_init_fn=seed_dataloader_worker)
 
     def _register_events(self):
         raise NotImplementedError
@@ -3,7 +3,6 @@ import numpy as np
 import torch
 
 from hypothesis.simulation import Simulator as BaseSimulator
-from torch.distributions.bernoulli import Bernoulli
 
 
 
@@ -13,40 +12,42 @@ class BiomolecularDockingSimulator(BaseSimulator):
     MAX_PSI = 0.0
     EXPERIMENTAL_SPACE = 100
 
-    def __init__(self, default_experimental_design=torch.zeros(EXPERIMENTAL_SPACE)):
+    def __init__(self, default_experimental_design=torch.zeros(EXPERIMENTAL_SPACE), flatten=True):
         super(BiomolecularDockingSimulator, self).__init__()
         self.default_experimental_design = default_experimental_design
+        self.flatten = flatten
+
+    def simulate_batch(self, thetas, psis):
+        r"""Simulates the responses of all thetas at all designs.
+
+        ``thetas`` has shape ``(N, 4)``, ``psis`` is either a ``(N, D)``
+        tensor with a design vector per theta, or a shared ``(D,)`` design
+        vector which is broadcasted (not copied) across the batch. Returns a
+        ``(N, D)`` tensor of Bernoulli draws.
+        """
+        thetas = thetas.view(-1, 4)
+        bottom = thetas[:, 0:1]
+        ee50 = thetas[:, 1:2]
+        slope = thetas[:, 2:3]
+        top = thetas[:, 3:4]
+        if psis.dim() == 1:
+            psis = psis.view(1, -1)
+        rates = bottom + (
+            (top - bottom)
+            /
+            (1 + (-(psis - ee50) * slope).exp()))
+
+        return torch.bernoulli(rates)
 
     def simulate(self, theta, psi):
-        bottom = theta[0].item()
-        ee50 = theta[1].item()
-        slope = theta[2].item()
-        top = theta[3].item()
-        n = len(psi)
-        x = torch.zeros(n)
-        for index in range(n):
-            rate = bottom + (
-                (top - bottom)
-                /
-                (1 + (-(psi[index] - ee50) * slope).exp()))
-            p = Bernoulli(rate)
-            x[index] = p.sample()
-
-        return x
+        return self.simulate_batch(theta, psi).view(-1)
 
     @torch.no_grad()
     def forward(self, inputs, experimental_configurations=None):
-        outputs = []
-
-        n = len(inputs)
-        for index in range(n):
-            theta = inputs[index]
-            if experimental_configurations is not None:
-                psi = experimental_configurations[index]
-                x = self.simulate(theta, psi)
-            else:
-                x = self.simulate(theta, self.default_experimental_design)
-            outputs.append(x.view(-1, 1))
-        outputs = torch.cat(outputs, dim=0)
+        if experimental_configurations is None:
+            experimental_configurations = self.default_experimental_design
+        outputs = self.simulate_batch(inputs, experimental_configurations)
+        if self.flatten:
+            outputs = outputs.view(-1, 1)
 
         return outputs
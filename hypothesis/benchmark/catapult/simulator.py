@@ -22,114 +22,135 @@ class CatapultSimulator(BaseSimulator):
         self.planet_radius = 6371000 # Meters
         self.air_density = 1.2
 
-    def _get_projectile(self, psi):
-        area = psi[0].item()
-        mass = psi[1].item()
-
-        return Projectile(area=area, mass=mass)
-
-    def _get_launch_angle(self, psi):
-        nominal_launch_angle = psi[2].item()
-        launch_angle = nominal_launch_angle + np.random.normal() * 0.1
-        # Check if the launch angle is valid (in radians).
-        if launch_angle < self.LAUNCH_ANGLE_LIMIT_LOW:
-            launch_angle = self.LAUNCH_ANGLE_LIMIT_LOW
-        elif launch_angle > self.LAUNCH_ANGLE_LIMIT_HIGH:
-            launch_angle = self.LAUNCH_ANGLE_LIMIT_HIGH
-
-        return launch_angle
-
-    def _get_launch_force(self, psi):
-        launch_force = psi[3].item()
-        #launch_force = launch_force + (np.random.normal() * 5) # Newton
-        if launch_force < 10:
-            launch_force = 10
-
-        return launch_force
-
-    def _get_wind(self):
-        return np.random.normal() * 5 # Meters per second
-
-    def simulate(self, theta, psi, trajectory=False):
+    def _get_launch_angles(self, psis):
+        nominal_launch_angles = psis[:, 2]
+        launch_angles = nominal_launch_angles + np.random.normal(size=len(psis)) * 0.1
+        # Check if the launch angles are valid (in radians).
+        launch_angles = np.clip(launch_angles,
+            self.LAUNCH_ANGLE_LIMIT_LOW,
+            self.LAUNCH_ANGLE_LIMIT_HIGH)
+
+        return launch_angles
+
+    def _get_launch_forces(self, psis):
+        launch_forces = psis[:, 3]
+        #launch_forces = launch_forces + (np.random.normal(size=len(psis)) * 5) # Newton
+
+        return np.maximum(launch_forces, 10)
+
+    def _get_winds(self, n):
+        return np.random.normal(size=n) * 5 # Meters per second
+
+    def simulate_batch(self, thetas, psis, trajectory=False):
+        r"""Integrates the flights of all projectiles simultaneously.
+
+        Every projectile is integrated until it hits the ground or leaves the
+        observational limit, after which it is removed from the state arrays.
+        Full trajectories are only recorded when ``trajectory`` is set, in
+        which case a list with a ``(T_i, 2)`` array per projectile is returned.
+        Otherwise the final distances (and nominal winds if ``record_wind``)
+        are returned as an ``(N,)`` (or ``(N, 2)``) array.
+        """
+        thetas = np.asarray(thetas, dtype=np.float64).reshape(-1)
+        psis = np.asarray(psis, dtype=np.float64).reshape(-1, 4)
+        n = len(thetas)
+        drag_coefficient = Projectile.DRAG_COEFFICIENT
         # Setup the initial conditions and simulator state
-        positions = []
-        G = theta.item() * (10 ** -11)
-        v_nominal_wind = self._get_wind()
-        launch_angle = self._get_launch_angle(psi)
-        launch_force = self._get_launch_force(psi)
-        projectile = self._get_projectile(psi)
-
-        # Compute the initial launch force.
-        force = np.zeros(2)
-        force[0] = np.cos(launch_angle) * launch_force
-        force[1] = np.sin(launch_angle) * launch_force
-
-        # Compute the force due to acceleration
-        force_gravitational = np.zeros(2)
-        force_gravitational[1] = -projectile.mass * ((G * self.planet_mass) / self.planet_radius ** 2)
-        positions.append(np.copy(projectile.position).reshape(1, 2))
+        G = thetas * (10 ** -11)
+        v_nominal_wind = self._get_winds(n)
+        launch_angles = self._get_launch_angles(psis)
+        launch_forces = self._get_launch_forces(psis)
+        areas = psis[:, 0]
+        masses = psis[:, 1].reshape(-1, 1)
+        positions = np.zeros((n, 2)) # x -> distance, y -> height
+        velocities = np.zeros((n, 2))
+        records = []
+        if trajectory:
+            records.append((np.arange(n), positions.copy()))
 
         # Apply the launching force for a 0.1 second.
-        n = int(0.1 / self.dt)
-        for _ in range(n):
-            projectile.apply(force, self.dt)
-            positions.append(np.copy(projectile.position).reshape(1, 2))
-
-        # Integrate until the projectile hits the ground.
-        while not projectile.stopped() and np.abs(projectile.position[0]) <= self.limit:
-            v_wind = v_nominal_wind + 0.01 * np.random.normal()
-            dv_x = projectile.velocity[0]
-            dv_y = projectile.velocity[1]
-
-            # Force of the wind component.
-            force_wind = np.zeros(2)
-            force_wind[0] = np.sign(v_wind) * 0.5 * self.air_density * (projectile.area / projectile.mass) * (v_wind ** 2)
-
-            # Force of the drag
-            force_drag = np.zeros(2)
-            force_drag[0] = np.sign(dv_x) * 0.5 * projectile.drag_coefficient * self.air_density * projectile.area * (dv_x ** 2)
-            force_drag[1] = np.sign(dv_y) * 0.5 * projectile.drag_coefficient * self.air_density * projectile.area * (dv_y ** 2)
-
-            # Compute net drag
-            force = force_gravitational + force_wind - force_drag
-            projectile.apply(force, self.dt)
-
-            # Check if projectile is within limits
-            x_position = projectile.position[0]
-            if np.abs(x_position) > self.limit:
-                x_position = np.sign(x_position) * self.limit
-                positions.append(np.array([[x_position, 0]]))
-            else:
-                positions.append(np.copy(projectile.position).reshape(1, 2))
-
-        positions = np.vstack(positions)
+        dv = np.stack([np.cos(launch_angles), np.sin(launch_angles)], axis=1)
+        dv *= launch_forces.reshape(-1, 1) * self.dt / masses
+        for _ in range(int(0.1 / self.dt)):
+            velocities += dv
+            positions += velocities * self.dt
+            if trajectory:
+                records.append((np.arange(n), positions.copy()))
+        distances = positions[:, 0].copy()
+
+        # Select the projectiles which are still in flight.
+        index = np.nonzero((positions[:, 1] >= 0) & (np.abs(positions[:, 0]) <= self.limit))[0]
+        positions = positions[index]
+        velocities = velocities[index]
+        areas = areas[index]
+        masses = masses[index]
+        winds = v_nominal_wind[index]
+        forces = np.zeros((len(index), 2))
+        forces[:, 1] = -masses[:, 0] * ((G[index] * self.planet_mass) / self.planet_radius ** 2)
+        # Integrate until all projectiles hit the ground or leave the limits.
+        while len(index) > 0:
+            v_wind = winds + 0.01 * np.random.normal(size=len(index))
+            # Net force: gravitation, wind and drag.
+            force = forces.copy()
+            force[:, 0] += np.sign(v_wind) * 0.5 * self.air_density * (areas / masses[:, 0]) * (v_wind ** 2)
+            force -= np.sign(velocities) * 0.5 * drag_coefficient * self.air_density * areas.reshape(-1, 1) * (velocities ** 2)
+            velocities += force * self.dt / masses
+            positions += velocities * self.dt
+            # Check if projectiles are within limits
+            x_positions = positions[:, 0]
+            out_of_limits = np.abs(x_positions) > self.limit
+            distances[index] = np.where(out_of_limits, np.sign(x_positions) * self.limit, x_positions)
+            if trajectory:
+                recorded = positions.copy()
+                recorded[out_of_limits, 0] = np.sign(x_positions[out_of_limits]) * self.limit
+                recorded[out_of_limits, 1] = 0
+                records.append((index, recorded))
+            # Remove the projectiles which completed their flight.
+            in_flight = ~out_of_limits & (positions[:, 1] >= 0)
+            if not in_flight.all():
+                index = index[in_flight]
+                positions = positions[in_flight]
+                velocities = velocities[in_flight]
+                areas = areas[in_flight]
+                masses = masses[in_flight]
+                winds = winds[in_flight]
+                forces = forces[in_flight]
+
         if trajectory:
-            return positions
+            indices = np.concatenate([r[0] for r in records])
+            recorded = np.concatenate([r[1] for r in records])
+            order = np.argsort(indices, kind="stable")
+            counts = np.bincount(indices, minlength=n)
+            return np.split(recorded[order], np.cumsum(counts)[:-1])
+        elif self.record_wind:
+            return np.stack([v_nominal_wind, distances], axis=1)
         else:
-            if self.record_wind:
-                return np.array([v_nominal_wind, positions[-1][0]])
-            else:
-                return positions[-1][0]
+            return distances
+
+    def simulate(self, theta, psi, trajectory=False):
+        theta = theta.view(-1).cpu().numpy()
+        psi = psi.view(1, -1).cpu().numpy()
+        outputs = self.simulate_batch(theta, psi, trajectory=trajectory)
+
+        return outputs[0]
 
     @torch.no_grad()
     def forward(self, inputs, experimental_configurations):
-        outputs = []
-
         n = len(inputs)
-        for index in range(n):
-            theta = inputs[index].view(-1)
-            psi = experimental_configurations[index].view(-1)
-            output = self.simulate(theta, psi).reshape(1, -1)
-            outputs.append(torch.from_numpy(output))
+        thetas = inputs.view(n).cpu().numpy()
+        psis = experimental_configurations.view(n, -1).cpu().numpy()
+        outputs = self.simulate_batch(thetas, psis).reshape(n, -1)
 
-        return torch.cat(outputs, dim=0).float()
+        return torch.from_numpy(outputs).float()
 
 
 
 class Projectile:
     r"""A spherical projectile."""
 
-    def __init__(self, area=0.1, mass=1.0, drag_coefficient=0.05):
+    DRAG_COEFFICIENT = 0.05
+
+    def __init__(self, area=0.1, mass=1.0, drag_coefficient=DRAG_COEFFICIENT):
         self.position = np.zeros(2) # x -> distance, y -> height
         self.velocity = np.zeros(2)
         self.mass = mass # Kilogram
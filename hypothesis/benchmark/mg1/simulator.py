@@ -22,41 +22,35 @@ class MG1Simulator(Simulator):
     """
 
     def __init__(self, percentiles=5, steps=50):
-        super(Simulator, self).__init__()
+        super(MG1Simulator, self).__init__()
         self.percentiles = int(percentiles)
         self.steps = int(steps)
 
-    def _generate(self, input):
-        input = input.view(-1)
-        p1 = input[0].item()
-        p2 = input[1].item()
-        p3 = input[2].item()
+    def _generate(self, inputs):
+        inputs = inputs.view(-1, 3).cpu().double().numpy()
+        n = inputs.shape[0]
+        p1 = inputs[:, :1]
+        p2 = inputs[:, 1:2]
+        p3 = inputs[:, 2:]
         # Service / processing time.
-        sts = (p2 - p1) * rng.random(self.num_steps) + p1
+        sts = (p2 - p1) * rng.random((n, self.steps)) + p1
         # Interarrival times.
-        iats = -np.log(1.0 - rng.rand(self.num_steps)) / p3
+        iats = -np.log(1.0 - rng.random((n, self.steps))) / p3
         # Arrival times.
-        ats = np.cumsum(iats)
-        # Interdeparture and departure times.
-        idts = np.empty(self.num_steps)
-        dts = np.empty(self.num_steps)
-        idts[0] = sts[0] + ats[0]
-        dts[0] = idts[0]
-        for i in range(1, self.num_steps):
-            idts[i] = sts[i] + max(0.0, ats[i] - dts[i-1])
-            dts[i] = dts[i-1] + idts[i]
+        ats = np.cumsum(iats, axis=1)
+        # Departure times, the recursion dts[i] = max(dts[i-1], ats[i]) + sts[i]
+        # unrolls to dts[i] = max_{j <= i}(ats[j] - cumsum(sts)[j-1]) + cumsum(sts)[i].
+        cumulative_sts = np.cumsum(sts, axis=1)
+        dts = np.maximum.accumulate(ats - cumulative_sts + sts, axis=1) + cumulative_sts
+        # Interdeparture times.
+        idts = np.diff(dts, axis=1, prepend=0.0)
         # Compute the observation.
-        perc = np.linspace(0.0, 100.0, self.num_percentiles)
-        stats = np.percentile(idts, perc)
+        perc = np.linspace(0.0, 100.0, self.percentiles)
+        stats = np.percentile(idts, perc, axis=1).T
 
-        return torch.tensor(stats).float().view(1, -1)
+        return torch.from_numpy(stats).float()
 
+    @torch.no_grad()
     def forward(self, inputs):
         r""""""
-        samples = []
-
-        for input in inputs:
-            x_out = self._generate(input)
-            samples.append(x_out.view(1, -1))
-
-        return torch.cat(samples, dim=0)
+        return self._generate(inputs)
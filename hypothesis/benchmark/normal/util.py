@@ -2,10 +2,9 @@ r"""Utilities for the normal benchmark.
 
 """
 
+import numpy as np
 import torch
 
-from torch.distributions.normal import Normal
-
 
 
 def Prior():
@@ -21,7 +20,20 @@ def Truth():
 
 
 def log_likelihood(theta, x):
-    return Normal(theta, 1).log_prob(x)
+    r"""Evaluates the log likelihood of the observations ``x`` under one or
+    a batch of thetas.
+
+    A batch of ``N`` thetas yields a tensor of shape ``(N,)`` holding the
+    summed log likelihoods of all observations.
+    """
+    theta = torch.as_tensor(theta).float()
+    thetas = theta.view(-1, 1)
+    x = torch.as_tensor(x).float().view(1, -1)
+    log_likelihood = (-0.5 * np.log(2 * np.pi) - 0.5 * (x - thetas) ** 2).sum(dim=1)
+    if theta.dim() == 0:
+        log_likelihood = log_likelihood.squeeze(0)
+
+    return log_likelihood
 
 
 
@@ -9,11 +9,15 @@ from torch.distributions.binomial import Binomial
 
 class SIRSimulator(BaseSimulator):
 
-    def __init__(self, population_size=1000, default_measurement_time=1.0, step_size=0.01):
+    def __init__(self, population_size=1000, default_measurement_time=1.0, step_size=0.01, batched=False):
         super(SIRSimulator, self).__init__()
         self.default_measurement_time = torch.tensor(default_measurement_time).float()
         self.population_size = int(population_size)
         self.step_size = float(step_size)
+        if batched:
+            self._forward = self._forward_batched
+        else:
+            self._forward = self._forward_sequential
 
     def simulate(self, theta, psi):
         # theta = [beta, gamma]
@@ -37,8 +41,39 @@ class SIRSimulator(BaseSimulator):
 
         return torch.tensor([S, I, R]).float()
 
-    @torch.no_grad()
-    def forward(self, inputs, experimental_configurations=None):
+    def simulate_batch(self, thetas, psis):
+        r"""Advances all epidemics in ``thetas`` simultaneously.
+
+        Every row of ``thetas`` holds ``[beta, gamma]``, the corresponding
+        entry of ``psis`` the measurement time. Epidemics which died out
+        (I = 0), or which reached their measurement time, are masked out
+        of the subsequent binomial draws.
+        """
+        thetas = thetas.view(-1, 2)
+        n = thetas.shape[0]
+        beta = thetas[:, 0].float()
+        gamma = thetas[:, 1].float()
+        S = torch.full((n,), float(self.population_size - 1), device=thetas.device)
+        I = torch.ones(n, device=thetas.device)
+        R = torch.zeros(n, device=thetas.device)
+        # Number of simulation steps of every epidemic (same rounding as `simulate`).
+        n_steps = (psis.view(-1).double() / self.step_size).long().to(thetas.device)
+        max_steps = int(n_steps.max().item()) if n > 0 else 0
+        for step in range(max_steps):
+            active = ((I > 0) & (n_steps > step)).nonzero().view(-1)
+            if len(active) == 0: # State of all epidemics will remain the same.
+                break
+            S_active = S[active]
+            I_active = I[active]
+            delta_I = Binomial(S_active, beta[active] * I_active / self.population_size).sample()
+            delta_R = Binomial(I_active, gamma[active]).sample()
+            S[active] = S_active - delta_I
+            I[active] = I_active + delta_I - delta_R
+            R[active] = R[active] + delta_R
+
+        return torch.stack([S, I, R], dim=1)
+
+    def _forward_sequential(self, inputs, experimental_configurations=None):
         outputs = []
 
         n = len(inputs)
@@ -53,3 +88,16 @@ class SIRSimulator(BaseSimulator):
         outputs = torch.cat(outputs, dim=0)
 
         return outputs
+
+    def _forward_batched(self, inputs, experimental_configurations=None):
+        n = len(inputs)
+        if experimental_configurations is not None:
+            psis = experimental_configurations.view(n)
+        else:
+            psis = self.default_measurement_time.repeat(n)
+
+        return self.simulate_batch(inputs, psis)
+
+    @torch.no_grad()
+    def forward(self, inputs, experimental_configurations=None):
+        return self._forward(inputs, experimental_configurations)
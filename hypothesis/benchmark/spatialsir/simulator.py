@@ -10,12 +10,16 @@ from torch.distributions.poisson import Poisson
 
 class SpatialSIRSimulator(BaseSimulator):
 
-    def __init__(self, initial_infections_rate=3, shape=(100, 100), default_measurement_time=1.0, step_size=0.01):
+    def __init__(self, initial_infections_rate=3, shape=(100, 100), default_measurement_time=1.0, step_size=0.01, batched=False):
         super(SpatialSIRSimulator, self).__init__()
         self.default_measurement_time = default_measurement_time
         self.lattice_shape = shape
         self.p_initial_infections = Poisson(float(initial_infections_rate))
         self.simulation_step_size = step_size
+        if batched:
+            self._forward = self._forward_batched
+        else:
+            self._forward = self._forward_sequential
 
     def _sample_num_initial_infections(self):
         return int(1 + self.p_initial_infections.sample().item())
@@ -25,9 +29,9 @@ class SpatialSIRSimulator(BaseSimulator):
         beta = theta[0].item()  # Infection rate
         gamma = theta[1].item() # Recovery rate
         # Allocate the data grids.
-        infected = np.zeros(self.lattice_shape, dtype=np.int)
-        recovered = np.zeros(self.lattice_shape, dtype=np.int)
-        kernel = np.ones((3, 3), dtype=np.int)
+        infected = np.zeros(self.lattice_shape, dtype=int)
+        recovered = np.zeros(self.lattice_shape, dtype=int)
+        kernel = np.ones((3, 3), dtype=int)
         # Seed the grid with the initial infections.
         num_initial_infections = self._sample_num_initial_infections()
         for _ in range(num_initial_infections):
@@ -44,12 +48,12 @@ class SpatialSIRSimulator(BaseSimulator):
             potential = signal.convolve2d(infected, kernel, mode="same")
             potential *= susceptible
             potential = potential * beta / 8
-            next_infected = ((potential > np.random.uniform(size=self.lattice_shape)).astype(np.int) + infected) * (1 - recovered)
-            next_infected = (next_infected >= 1).astype(np.int)
+            next_infected = ((potential > np.random.uniform(size=self.lattice_shape)).astype(int) + infected) * (1 - recovered)
+            next_infected = (next_infected >= 1).astype(int)
             # Recover
             potential = infected * gamma
-            next_recovered = (potential > np.random.uniform(size=self.lattice_shape)).astype(np.int) + recovered
-            next_recovered = (next_recovered >= 1).astype(np.int)
+            next_recovered = (potential > np.random.uniform(size=self.lattice_shape)).astype(int) + recovered
+            next_recovered = (next_recovered >= 1).astype(int)
             # Next parameters
             recovered = next_recovered
             infected = next_infected
@@ -62,8 +66,87 @@ class SpatialSIRSimulator(BaseSimulator):
 
         return image
 
-    @torch.no_grad()
-    def forward(self, inputs, experimental_configurations=None):
+    def _seed_lattices(self, n, device):
+        height, width = self.lattice_shape
+        infected = torch.zeros(n, height * width, dtype=torch.bool, device=device)
+        num_initial_infections = 1 + self.p_initial_infections.sample(torch.Size([n])).long().to(device)
+        max_initial_infections = int(num_initial_infections.max().item())
+        indices = torch.randint(0, height * width, (n, max_initial_infections), device=device)
+        mask = torch.arange(max_initial_infections, device=device).view(1, -1) < num_initial_infections.view(-1, 1)
+        rows = torch.arange(n, device=device).view(-1, 1).expand_as(indices)
+        infected[rows[mask], indices[mask]] = True
+
+        return infected.view(n, height, width)
+
+    @staticmethod
+    def _neighbourhood(lattices):
+        r"""Batched 3x3 neighbourhood sum of ``(B, H, W)`` lattices.
+
+        Equivalent to ``convolve2d(lattice, ones((3, 3)), mode="same")`` for
+        every lattice, but computed as a separable box filter.
+        """
+        padded = torch.nn.functional.pad(lattices, (1, 1, 1, 1))
+        rows = padded[:, :, :-2] + padded[:, :, 1:-1] + padded[:, :, 2:]
+
+        return rows[:, :-2, :] + rows[:, 1:-1, :] + rows[:, 2:, :]
+
+    def simulate_batch(self, thetas, psis):
+        r"""Evolves a stack of lattices, one for every row in ``thetas``.
+
+        The lattice states are kept as ``(B, H, W)`` boolean tensors and the
+        infection potential of all lattices is computed with a single batched
+        3x3 neighbourhood sum. Lattices without infections, or which
+        reached their measurement time, drop out of the subsequent steps.
+        """
+        thetas = thetas.view(-1, 2)
+        n = thetas.shape[0]
+        device = thetas.device
+        beta = thetas[:, 0].float().view(-1, 1, 1)
+        gamma = thetas[:, 1].float().view(-1, 1, 1)
+        # Allocate the data grids and seed them with the initial infections.
+        infected = self._seed_lattices(n, device)
+        recovered = torch.zeros_like(infected)
+        # Derrive the maximum number of simulation steps of every lattice.
+        simulation_steps = (psis.view(-1).double() / self.simulation_step_size).long().to(device)
+        max_simulation_steps = int(simulation_steps.max().item()) if n > 0 else 0
+        for step in range(max_simulation_steps):
+            active = infected.view(n, -1).any(dim=1) & (simulation_steps > step)
+            num_active = int(active.sum().item())
+            if num_active == 0:
+                break
+            # Only gather the lattices which are still evolving.
+            if num_active < n:
+                active = active.nonzero().view(-1)
+                I = infected[active]
+                R = recovered[active]
+                beta_active = beta[active]
+                gamma_active = gamma[active]
+            else:
+                I = infected
+                R = recovered
+                beta_active = beta
+                gamma_active = gamma
+            susceptible = ~(I | R)
+            # Infection
+            potential = self._neighbourhood(I.float())
+            potential = potential * susceptible * beta_active / 8
+            next_infected = ((potential > torch.rand(potential.shape, device=device)) | I) & ~R
+            # Recover
+            potential = I * gamma_active
+            next_recovered = (potential > torch.rand(potential.shape, device=device)) | R
+            # Next parameters
+            if num_active < n:
+                infected[active] = next_infected
+                recovered[active] = next_recovered
+            else:
+                infected = next_infected
+                recovered = next_recovered
+        susceptible = ~(infected | recovered)
+        image = torch.stack([susceptible, infected, recovered], dim=1)
+
+        return image.float()
+
+    def _forward_sequential(self, inputs, experimental_configurations=None):
         outputs = []
 
         n = len(inputs)
@@ -77,3 +160,16 @@ class SpatialSIRSimulator(BaseSimulator):
             outputs.append(x)
 
         return torch.cat(outputs, dim=0).float()
+
+    def _forward_batched(self, inputs, experimental_configurations=None):
+        n = len(inputs)
+        if experimental_configurations is not None:
+            psis = experimental_configurations.view(n)
+        else:
+            psis = torch.tensor(self.default_measurement_time).repeat(n)
+
+        return self.simulate_batch(inputs, psis)
+
+    @torch.no_grad()
+    def forward(self, inputs, experimental_configurations=None):
+        return self._forward(inputs, experimental_configurations)
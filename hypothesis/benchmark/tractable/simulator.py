@@ -1,7 +1,7 @@
 import torch
 
 from hypothesis.simulation import Simulator
-from torch.distributions.multivariate_normal import MultivariateNormal as Normal
+from .util import parameters
 
 
 
@@ -15,26 +15,19 @@ class TractableSimulator(Simulator):
     def __init__(self):
         super(TractableSimulator, self).__init__()
 
-    def _generate(self, input):
-        mean = torch.tensor([input[0], input[1]])
-        scale = 1.0
-        s_1 = input[2] ** 2
-        s_2 = input[3] ** 2
-        rho = input[4].tanh()
-        covariance = torch.tensor([
-            [scale * s_1 ** 2, scale * rho * s_1 * s_2],
-            [scale * rho * s_1 * s_2, scale * s_2 ** 2]])
-        normal = Normal(mean, covariance)
-        x_out = normal.sample(torch.Size([4])).view(1, -1)
+    def _generate(self, inputs, num_samples=4):
+        means, scales, rhos = parameters(inputs)
+        means = means.unsqueeze(1)
+        scales = scales.unsqueeze(1)
+        rhos = rhos.view(-1, 1)
+        # Sample through the Cholesky factor of the 2x2 covariance matrix.
+        z = torch.randn(len(rhos), num_samples, 2, dtype=means.dtype, device=means.device)
+        x_1 = z[:, :, 0]
+        x_2 = rhos * z[:, :, 0] + (1 - rhos ** 2).sqrt() * z[:, :, 1]
+        x_out = means + scales * torch.stack([x_1, x_2], dim=2)
 
-        return x_out
+        return x_out.view(len(rhos), -1)
 
     def forward(self, inputs):
         r""""""
-        samples = []
-
-        for input in inputs:
-            x_out = self._generate(input)
-            samples.append(x_out.view(1, -1))
-
-        return torch.cat(samples, dim=0)
+        return self._generate(inputs)
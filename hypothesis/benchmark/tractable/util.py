@@ -2,17 +2,16 @@ r"""Utilities for the tractable benchmark.
 
 """
 
+import numpy as np
 import torch
 
-from torch.distributions.multivariate_normal import MultivariateNormal as Normal
-
 
 
 def Prior():
     lower = -3 * torch.ones(5).float()
     upper = 3 * torch.ones(5).float()
 
-    return Uniform(lower, lower)
+    return Uniform(lower, upper)
 
 
 def Truth():
@@ -21,20 +20,37 @@ def Truth():
     return torch.tensor(truth).float()
 
 
+def parameters(thetas):
+    r"""Maps a ``(N, 5)`` batch of thetas to the parameters of the bivariate
+    normal: the means ``(N, 2)``, the standard deviations ``(N, 2)`` and
+    the correlations ``(N,)``."""
+    thetas = thetas.view(-1, 5)
+    means = thetas[:, :2]
+    scales = thetas[:, 2:4] ** 2
+    rhos = thetas[:, 4].tanh()
+
+    return means, scales, rhos
+
+
 def log_likelihood(theta, x):
+    r"""Evaluates the log likelihood of the observations ``x`` under one or
+    a batch of thetas.
+
+    The bivariate normal is evaluated in closed form through the 2x2
+    Cholesky factor of the covariance matrix. A single theta yields a scalar,
+    a ``(N, 5)`` batch of thetas a tensor of shape ``(N,)``.
+    """
     with torch.no_grad():
-        input = theta
-        mean = torch.tensor([input[0], input[1]])
-        scale = 1.0
-        s_1 = input[2] ** 2
-        s_2 = input[3] ** 2
-        rho = input[4].tanh()
-        covariance = torch.tensor([
-            [scale * s_1 ** 2, scale * rho * s_1 * s_2],
-            [scale * rho * s_1 * s_2, scale * s_2 ** 2]])
-        normal = Normal(mean, covariance)
-        m = x.view(-1, 2)
-        log_likelihood = normal.log_prob(m).sum()
+        means, scales, rhos = parameters(theta)
+        m = x.view(1, -1, 2)
+        z = (m - means.unsqueeze(1)) / scales.unsqueeze(1)
+        rhos = rhos.view(-1, 1)
+        one_minus_rho_squared = 1 - rhos ** 2
+        mahalanobis = (z[:, :, 0] ** 2 - 2 * rhos * z[:, :, 0] * z[:, :, 1] + z[:, :, 1] ** 2) / one_minus_rho_squared
+        log_normalizer = np.log(2 * np.pi) + scales.log().sum(dim=1, keepdim=True) + 0.5 * one_minus_rho_squared.log()
+        log_likelihood = (-log_normalizer - 0.5 * mahalanobis).sum(dim=1)
+        if theta.dim() <= 1:
+            log_likelihood = log_likelihood.squeeze(0)
 
     return log_likelihood
 
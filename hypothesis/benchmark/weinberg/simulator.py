@@ -41,40 +41,53 @@ class WeinbergSimulator(BaseSimulator):
 
         return ((1 + costheta**2) + self._a_fb(sqrtshalf, gf) * costheta) / norm
 
+    def _maxval(self, sqrtshalf, gf):
+        r"""The differential cross-section is convex in ``costheta``, so its
+        maximum over [-1, 1] is attained at one of the boundaries."""
+        return np.maximum(
+            self._diffxsec(-1., sqrtshalf, gf),
+            self._diffxsec(1., sqrtshalf, gf))
+
+    def simulate_batch(self, thetas, psis):
+        r"""Draws ``num_samples`` angles for every pair in ``thetas`` (gf)
+        and ``psis`` (sqrtshalf) by vectorized rejection sampling.
+
+        Returns an array of shape ``(N, num_samples)``.
+        """
+        thetas = np.asarray(thetas, dtype=np.float64).reshape(-1)
+        psis = np.asarray(psis, dtype=np.float64).reshape(-1)
+        n = len(thetas)
+        maxvals = self._maxval(psis, thetas)
+        samples = np.empty((n, self.num_samples))
+        rows, columns = np.nonzero(np.ones((n, self.num_samples), dtype=bool))
+        # Keep proposing for the entries which have not been accepted yet.
+        while len(rows) > 0:
+            xprop = np.random.uniform(-1, 1, size=len(rows))
+            ycut = np.random.random(size=len(rows))
+            maxval = maxvals[rows]
+            yprop = self._diffxsec(xprop, psis[rows], thetas[rows]) / maxval
+            accepted = yprop >= ycut
+            samples[rows[accepted], columns[accepted]] = xprop[accepted]
+            rows = rows[~accepted]
+            columns = columns[~accepted]
+
+        return samples
+
     def simulate(self, theta, psi):
         # theta = gf
         # psi = sqrtshalf
-        samples = []
-
-        for _ in range(self.num_samples):
-            sample = None
-            x = np.linspace(-1, 1, 10000)
-            maxval = np.max(self._diffxsec(x, psi, theta))
-            while sample is None:
-                xprop = np.random.uniform(-1, 1)
-                ycut = np.random.random()
-                yprop = self._diffxsec(xprop, psi, theta) / maxval
-                if yprop / maxval < ycut:
-                    continue
-                sample = xprop
-            sample = torch.tensor(sample).view(1, 1)
-            samples.append(sample)
-
-        return torch.cat(samples, dim=1)
+        samples = self.simulate_batch(theta, psi)
+
+        return torch.from_numpy(samples).float().view(1, -1)
 
     @torch.no_grad()
     def forward(self, inputs, experimental_configurations=None):
-        outputs = []
-
         n = len(inputs)
-        for index in range(n):
-            theta = inputs[index]
-            if experimental_configurations is not None:
-                psi = experimental_configurations[index]
-                x = self.simulate(theta.item(), psi.item())
-            else:
-                x = self.simulate(theta.item(), self.default_beam_energy)
-            outputs.append(x)
-        outputs = torch.cat(outputs, dim=0)
+        thetas = inputs.view(n).cpu().numpy()
+        if experimental_configurations is not None:
+            psis = experimental_configurations.view(n).cpu().numpy()
+        else:
+            psis = np.full(n, self.default_beam_energy)
+        outputs = torch.from_numpy(self.simulate_batch(thetas, psis)).float()
 
         return outputs
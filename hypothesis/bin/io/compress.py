@@ -0,0 +1,45 @@
+r"""A utility program to compress data files.
+
+Converts ``.npy`` files into chunked archives, which are read by
+``hypothesis.util.data.numpy.CompressedStorage``. Binary data (such as the
+SpatialSIR lattices) is bit-packed.
+"""
+
+import argparse
+import os
+
+from hypothesis.util.data.numpy import compress
+
+
+
+def main(arguments):
+    ratio = compress(
+        input_file=arguments.file,
+        output_file=arguments.out,
+        chunk_size=arguments.chunk_size,
+        codec=arguments.codec,
+        compression=not arguments.no_compression)
+    print("Compressed", arguments.file, "into", arguments.out, "({:.1f}x smaller).".format(ratio))
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser("Compress: converts data files into compressed, chunked archives.")
+    parser.add_argument("--chunk-size", type=int, default=1024, help="Number of rows per chunk (default: 1024).")
+    parser.add_argument("--codec", type=str, default=None, help="Codec of the chunks, available options: bits, raw. Selected per chunk by default (default: none).")
+    parser.add_argument("--file", type=str, default=None, help="Path to the .npy file to compress (default: none).")
+    parser.add_argument("--no-compression", action="store_true", help="Disables the deflate compression of the chunks (default: false).")
+    parser.add_argument("--out", type=str, default=None, help="Output path of the archive, should end with .npz (default: none).")
+    arguments, _ = parser.parse_known_args()
+    # Check if an input file has been specified.
+    if arguments.file is None or not os.path.exists(arguments.file):
+        raise ValueError("No (existing) input file has been specified.")
+    # Check if an output path has been specified.
+    if arguments.out is None:
+        raise ValueError("No output path has been specified.")
+
+    return arguments
+
+
+if __name__ == "__main__":
+    arguments = parse_arguments()
+    main(arguments)
@@ -24,7 +24,8 @@ def procedure_numpy(arguments):
         output_file=arguments.out,
         tempfile=arguments.tempfile,
         in_memory=arguments.in_memory,
-        axis=arguments.dimension)
+        axis=arguments.dimension,
+        workers=arguments.workers)
 
 
 def procedure_torch(arguments):
@@ -71,7 +72,8 @@ def parse_arguments():
     parser.add_argument("--in-memory", action="store_true", help="Processes all chunks in memory (default: false).")
     parser.add_argument("--out", type=str, default=None, help="Output path to store the result (default: none).")
     parser.add_argument("--sort", action="store_true", help="Sort the input files before processing (default: false).")
-    parser.add_argument("--tempfile", type=str, default=None, help="Path of the temporary file to store the intermediate results, only accessible to non in-memory operations. (default: none).")
+    parser.add_argument("--tempfile", type=str, default=None, help="Deprecated, the data is streamed directly into the output file (default: none).")
+    parser.add_argument("--workers", type=int, default=1, help="Number of processes writing the input files concurrently, only accessible to non in-memory operations (default: 1).")
     arguments, _ = parser.parse_known_args()
     # Check if a proper extension has been specified.
     if select_extension_procedure(arguments) is None:
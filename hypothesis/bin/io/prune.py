@@ -1,5 +1,8 @@
 r"""A utility program to prune data files.
 
+Entries are removed in a streaming fashion with a bounded memory budget.
+Besides single files, all shards of a sharded dataset can be pruned at once
+by specifying the dataset directory through ``--shards``.
 """
 
 import argparse
@@ -8,37 +11,129 @@ import os
 import shutil
 import torch
 
+from hypothesis.util.data.numpy import prune
+from hypothesis.util.data.numpy.sharded import checksum
+from hypothesis.util.data.numpy.sharded import load_manifest
+from hypothesis.util.data.numpy.sharded import store_manifest
+
 
 
 def main(arguments):
-    # Check if the file needs to be processed in memory.
-    if arguments.in_memory:
-        mmap_mode = 'r'
+    if arguments.shards is not None:
+        procedure_shards(arguments)
     else:
-        mmap_mode = None
-    data = np.load(arguments.in_file, mmap_mode=mmap_mode)
-    data = np.delete(data, arguments.indices, arguments.dimension)
-    np.save(arguments.out_file, data)
+        procedure_file(arguments)
+
+
+def procedure_file(arguments):
+    prune(arguments.in_file, arguments.out_file,
+        indices=arguments.indices,
+        mask=load_mask(arguments),
+        axis=arguments.dimension,
+        in_memory=arguments.in_memory,
+        chunk_bytes=arguments.chunk_size)
+
+
+def procedure_shards(arguments):
+    manifest = load_manifest(arguments.shards)
+    variables = arguments.variables
+    if variables is None:
+        variables = list(manifest["variables"].keys())
+    mask = load_mask(arguments)
+    total_rows = sum(shard["rows"] for shard in manifest["shards"])
+    os.makedirs(arguments.out_file, exist_ok=True)
+    offset = 0
+    for shard in manifest["shards"]:
+        rows = shard["rows"]
+        for variable, file_name in shard["files"].items():
+            in_path = os.path.join(arguments.shards, file_name)
+            out_path = os.path.join(arguments.out_file, file_name)
+            if arguments.dimension == 0:
+                # Rows are removed from all variables, map the global indices to the shard.
+                remaining = prune(in_path, out_path,
+                    indices=shard_indices(arguments.indices, offset, rows, total_rows),
+                    mask=None if mask is None else mask[offset:offset + rows],
+                    axis=0,
+                    in_memory=arguments.in_memory,
+                    chunk_bytes=arguments.chunk_size)
+            elif variable in variables:
+                prune(in_path, out_path,
+                    indices=arguments.indices,
+                    mask=mask,
+                    axis=arguments.dimension,
+                    in_memory=arguments.in_memory,
+                    chunk_bytes=arguments.chunk_size)
+                remaining = rows
+            else:
+                shutil.copyfile(in_path, out_path)
+                remaining = rows
+            shard["checksums"][variable] = checksum(out_path)
+        shard["rows"] = remaining
+        offset += rows
+    # Update the shapes of the pruned variables.
+    if arguments.dimension > 0:
+        for variable in variables:
+            out_path = os.path.join(arguments.out_file, manifest["shards"][0]["files"][variable])
+            shape = np.load(out_path, mmap_mode="r").shape
+            manifest["variables"][variable]["shape"] = list(shape[1:])
+    store_manifest(arguments.out_file, manifest)
+
+
+def shard_indices(indices, offset, rows, total_rows):
+    r"""Maps the global row indices to the rows of the shard at ``offset``."""
+    if indices is None:
+        return None
+    selection = np.zeros(total_rows, dtype=bool)
+    for index in indices:
+        selection[index] = True
+
+    return np.flatnonzero(selection[offset:offset + rows])
+
+
+def load_mask(arguments):
+    if arguments.mask is None:
+        return None
+
+    return np.load(arguments.mask).astype(bool).reshape(-1)
+
+
+def parse_indices(indices):
+    r"""Parses a comma-separated list of indices and ranges, e.g., '0,3:7,-1'."""
+    parsed = []
+    for index in indices.split(','):
+        if ':' in index:
+            parsed.append(slice(*[int(i) if len(i) > 0 else None for i in index.split(':')]))
+        else:
+            parsed.append(int(index))
+
+    return parsed
 
 
 def parse_arguments():
     parser = argparse.ArgumentParser("Prune: pruning data files for you convenience.")
+    parser.add_argument("--chunk-size", type=int, default=1 << 26, help="Memory budget of a single chunk in bytes (default: 64 MiB).")
     parser.add_argument("--dimension", type=int, default=1, help="Data dimension to work in (default: 1).")
     parser.add_argument("--in-file", type=str, default=None, help="Path to the file to process (default: none).")
     parser.add_argument("--in-memory", action="store_true", help="Process the data in-memory (default: false).")
-    parser.add_argument("--indices", type=str, default=None, help="A comma-seperated list of indices to remove (default: none).")
-    parser.add_argument("--out-file", type=str, default=None, help="Path of the processed file (default: none).")
+    parser.add_argument("--indices", type=str, default=None, help="A comma-seperated list of indices and ranges (start:stop) to remove (default: none).")
+    parser.add_argument("--mask", type=str, default=None, help="Path to a boolean numpy array marking the entries to remove (default: none).")
+    parser.add_argument("--out-file", type=str, default=None, help="Path of the processed file, or directory in combination with --shards (default: none).")
+    parser.add_argument("--shards", type=str, default=None, help="Directory of a sharded dataset to process instead of a single file (default: none).")
+    parser.add_argument("--variables", type=str, default=None, help="Comma-separated variables of the sharded dataset to prune in dimensions other than 0 (default: all).")
     arguments, _ = parser.parse_known_args()
     # Check if an input file has been specified.
-    if arguments.in_file is None:
+    if arguments.in_file is None and arguments.shards is None:
         raise ValueError("No input file has been specified.")
     # Check if an output file has been specified.
     if arguments.out_file is None:
         raise ValueError("No output file has been specified.")
     # Check if indices have been specified.
-    if arguments.indices is None:
+    if arguments.indices is None and arguments.mask is None:
         raise ValueError("No indices have been specified.")
-    arguments.indices = [int(index) for index in arguments.indices.split(',')]
+    if arguments.indices is not None:
+        arguments.indices = parse_indices(arguments.indices)
+    if arguments.variables is not None:
+        arguments.variables = arguments.variables.split(',')
 
     return arguments
 
@@ -42,20 +42,26 @@ def main(arguments):
             beta=arguments.conservativeness,
             denominator=arguments.denominator,
             estimator=estimator,
-            logits=arguments.logits)
+            fused=arguments.fused,
+            logits=arguments.logits,
+            negatives=arguments.negatives)
     else:
         criterion = BaseCriterion(
             batch_size=arguments.batch_size,
             denominator=arguments.denominator,
             estimator=estimator,
-            logits=arguments.logits)
+            fused=arguments.fused,
+            logits=arguments.logits,
+            negatives=arguments.negatives)
     # Check if the experimental settings have to be activated
     if arguments.experimental:
         criterion = BaseExperimentalCriterion(
             batch_size=arguments.batch_size,
             denominator=arguments.denominator,
             estimator=estimator,
-            logits=arguments.logits)
+            fused=arguments.fused,
+            logits=arguments.logits,
+            negatives=arguments.negatives)
     # Allocate the learning rate scheduler, if requested.
     if arguments.lrsched:
         if arguments.lrsched_every is None or arguments.lrsched_gamma is None:
@@ -69,6 +75,9 @@ def main(arguments):
     trainer = Trainer(
         accelerator=hypothesis.accelerator,
         batch_size=arguments.batch_size,
+        channels_last=arguments.channels_last,
+        checkpoint=arguments.checkpoint,
+        checkpoint_every=arguments.checkpoint_every,
         criterion=criterion,
         dataset_test=dataset_test,
         dataset_train=dataset_train,
@@ -77,11 +86,12 @@ def main(arguments):
         lr_scheduler=lr_scheduler,
         shuffle=(not arguments.dont_shuffle),
         optimizer=optimizer,
+        precision=arguments.precision,
         workers=arguments.workers)
     # Register the callbacks
     if arguments.show:
         # Callbacks
-        progress_bar = tqdm(total=arguments.epochs)
+        progress_bar = tqdm(total=arguments.epochs, initial=trainer.epochs - trainer.epochs_remaining)
         def report_test_loss(caller):
             trainer = caller
             current_epoch = trainer.current_epoch
@@ -160,13 +170,19 @@ def parse_arguments():
     parser.add_argument("--amsgrad", action="store_true", help="Use AMSGRAD version of Adam (default: false).")
     parser.add_argument("--batch-size", type=int, default=64, help="Batch size (default: 64).")
     parser.add_argument("--conservativeness", type=float, default=0.0, help="Conservative term (default: 0.0).")
+    parser.add_argument("--channels-last", action="store_true", help="Use the channels-last memory format for 2-dimensional convolutional heads (default: false).")
+    parser.add_argument("--checkpoint", type=str, default=None, help="Path of the checkpoint, training resumes from it if it exists (default: none).")
+    parser.add_argument("--checkpoint-every", type=int, default=None, help="Additionally checkpoint every n batches (default: none).")
     parser.add_argument("--clip-grad", type=float, default=0.0, help="Value to clip the gradients with (default: 0.0 or no clipping).")
     parser.add_argument("--epochs", type=int, default=1, help="Number of epochs (default: 1).")
+    parser.add_argument("--fused", action="store_true", help="Evaluate the dependent and independent batches in a single forward pass (default: false).")
     parser.add_argument("--logits", action="store_true", help="Use the logit-trick for the minimization criterion (default: false).")
     parser.add_argument("--lr", type=float, default=0.001, help="Learning rate (default: 0.001).")
     parser.add_argument("--lrsched", action="store_true", help="Enable learning rate scheduling (default: false).")
     parser.add_argument("--lrsched-every", type=int, default=None, help="Schedule the learning rate every n epochs (default: none).")
     parser.add_argument("--lrsched-gamma", type=float, default=None, help="Learning rate scheduling stepsize (default: none).")
+    parser.add_argument("--negatives", type=lambda k: k if k == "all" else int(k), default=1, help="Number of independent samples contrasted with every dependent sample, or 'all' (default: 1).")
+    parser.add_argument("--precision", type=str, default=None, choices=["bf16", "fp16"], help="Train in mixed precision, bf16 is supported on CPU (default: none).")
     parser.add_argument("--weight-decay", type=float, default=0.0, help="Weight decay (default: 0.0).")
     parser.add_argument("--workers", type=int, default=2, help="Number of concurrent data loaders (default: 2).")
     # Data settings
@@ -0,0 +1,83 @@
+r"""A utility program to simulate datasets to disk.
+
+Produces ``inputs.npy`` and ``outputs.npy`` in the output directory. An
+interrupted run resumes after the last completed batch when executed again
+with the same arguments.
+"""
+
+import argparse
+import warnings
+
+from hypothesis.simulation import ParallelSimulator
+from hypothesis.simulation import SimulationPipeline
+from hypothesis.util import seed_process
+
+
+
+def main(arguments):
+    if arguments.seed is not None:
+        seed_process(arguments.seed)
+    prior = load_class(arguments.prior)()
+    simulator = load_class(arguments.simulator)()
+    if arguments.workers > 1:
+        # Seeded batches are distributed in blocks of `seed_block_size` rows.
+        if arguments.seed is not None and arguments.batch_size < arguments.workers * arguments.seed_block_size:
+            warnings.warn("Seeded batches of {} simulations are split into at most {} blocks of {} rows, "
+                "some of the {} workers will be idle. Increase --batch-size or decrease --seed-block-size.".format(
+                arguments.batch_size, -(-arguments.batch_size // arguments.seed_block_size),
+                arguments.seed_block_size, arguments.workers))
+        simulator = ParallelSimulator(simulator,
+            workers=arguments.workers,
+            dynamic=arguments.dynamic,
+            seed=arguments.seed,
+            seed_block_size=arguments.seed_block_size)
+    pipeline = SimulationPipeline(
+        simulator=simulator,
+        prior=prior,
+        directory=arguments.out,
+        batch_size=arguments.batch_size,
+        queue_size=arguments.queue_size)
+    try:
+        pipeline.run(size=arguments.size)
+    finally:
+        simulator.terminate()
+
+
+def load_class(full_classname):
+    if full_classname is None:
+        raise ValueError("The specified classname cannot be `None`.")
+    module_name, class_name = full_classname.rsplit('.', 1)
+    module = __import__(module_name, fromlist=[class_name])
+
+    return getattr(module, class_name)
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser("Simulate: simulating datasets to disk.")
+    parser.add_argument("--batch-size", type=int, default=1024, help="Number of simulations per batch (default: 1024).")
+    parser.add_argument("--dynamic", action="store_true", help="Dynamically balance the batches over the workers (default: false).")
+    parser.add_argument("--out", type=str, default=None, help="Output directory (default: none).")
+    parser.add_argument("--prior", type=str, default=None, help="Full classname of the prior (default: none).")
+    parser.add_argument("--queue-size", type=int, default=4, help="Number of batches buffered between simulation and disk writes (default: 4).")
+    parser.add_argument("--seed", type=int, default=None, help="Root seed of the simulations (default: none).")
+    parser.add_argument("--seed-block-size", type=int, default=16, help="Number of simulations sharing a random stream when seeded (default: 16).")
+    parser.add_argument("--simulator", type=str, default=None, help="Full classname of the simulator (default: none).")
+    parser.add_argument("--size", type=int, default=None, help="Number of simulations (default: none).")
+    parser.add_argument("--workers", type=int, default=1, help="Number of simulation processes (default: 1).")
+    arguments, _ = parser.parse_known_args()
+    # Check if the required arguments have been specified.
+    if arguments.out is None:
+        raise ValueError("No output directory has been specified.")
+    if arguments.prior is None:
+        raise ValueError("No prior has been specified.")
+    if arguments.simulator is None:
+        raise ValueError("No simulator has been specified.")
+    if arguments.size is None:
+        raise ValueError("The number of simulations has not been specified.")
+
+    return arguments
+
+
+if __name__ == "__main__":
+    arguments = parse_arguments()
+    main(arguments)
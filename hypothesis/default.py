@@ -37,3 +37,10 @@ r"""Split character indicating the independene between random variables."""
 
 dataloader_workers = 4
 r"""Default number of dataloader workers."""
+
+device_dataset_threshold = 2 ** 28
+r"""Size (in bytes) below which in-memory datasets are moved to the accelerator.
+
+Such datasets are iterated with a ``DeviceDataLoader`` instead of a ``DataLoader``.
+Set to 0 to disable.
+"""
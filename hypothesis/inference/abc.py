@@ -4,6 +4,9 @@ import hypothesis
 import torch
 
 from hypothesis.engine import Procedure
+from hypothesis.util.seeding import seed_process
+from hypothesis.util.seeding import spawn_seeds
+from numpy.random import SeedSequence
 from torch.multiprocessing import Pool
 
 
@@ -48,11 +51,21 @@ class ApproximateBayesianComputation(Procedure):
 
 
 class ParallelApproximateBayesianComputation:
+    r"""Draws the posterior samples of ``abc`` with a pool of workers.
 
-    def __init__(self, abc, workers=2):
+    Every worker is seeded with fresh entropy at start-up. If a root ``seed``
+    is specified, every chunk of every call is sampled with its own random
+    stream derived from it, which makes the samples reproducible.
+    """
+
+    def __init__(self, abc, workers=2, seed=None):
         super(ParallelApproximateBayesianComputation, self).__init__()
         self.abc = abc
-        self.pool = Pool(processes=workers)
+        self.pool = Pool(processes=workers, initializer=seed_process)
+        if seed is not None:
+            self.seed_sequence = SeedSequence(seed)
+        else:
+            self.seed_sequence = None
         self.workers = workers
 
     def _prepare_arguments(self, observation, num_samples):
@@ -63,8 +76,12 @@ class ParallelApproximateBayesianComputation:
         if num_chunks == 0:
             num_chunks = 1
         chunks = inputs.split(num_chunks, dim=0)
-        for chunk in chunks:
-            a = (self.abc, observation, len(chunk))
+        if self.seed_sequence is not None:
+            seeds = spawn_seeds(self.seed_sequence.spawn(1)[0], len(chunks))
+        else:
+            seeds = [None] * len(chunks)
+        for chunk, seed in zip(chunks, seeds):
+            a = (self.abc, observation, len(chunk), seed)
             arguments.append(a)
 
         return arguments
@@ -83,6 +100,8 @@ class ParallelApproximateBayesianComputation:
 
     @staticmethod
     def _sample(arguments):
-        abc, observation, n = arguments
+        abc, observation, n, seed = arguments
+        if seed is not None:
+            seed_process(seed)
 
         return abc.sample(observation, num_samples=n)
@@ -7,6 +7,9 @@ import torch
 
 from hypothesis.engine import Procedure
 from hypothesis.summary.mcmc import Chain
+from hypothesis.util.seeding import seed_process
+from hypothesis.util.seeding import spawn_seeds
+from numpy.random import SeedSequence
 from torch.distributions.multivariate_normal import MultivariateNormal
 from torch.distributions.normal import Normal
 from torch.multiprocessing import Pool
@@ -14,16 +17,30 @@ from torch.multiprocessing import Pool
 
 
 class ParallelSampler:
+    r"""Samples ``chains`` Markov chains of ``sampler`` with a pool of workers.
 
-    def __init__(self, sampler, chains=2, workers=torch.multiprocessing.cpu_count()):
+    Every worker is seeded with fresh entropy at start-up. If a root ``seed``
+    is specified, every chain of every call is sampled with its own random
+    stream derived from it, which makes the chains reproducible.
+    """
+
+    def __init__(self, sampler, chains=2, workers=torch.multiprocessing.cpu_count(), seed=None):
         self.chains = chains
         self.sampler = sampler
+        if seed is not None:
+            self.seed_sequence = SeedSequence(seed)
+        else:
+            self.seed_sequence = None
         self.workers = workers
 
-    def _prepare_arguments(self, observations, thetas, num_samples):
+    def _prepare_arguments(self, observations, inputs, num_samples):
         arguments = []
-        for input in inputs:
-            arguments.append(self.sampler, observations, input, num_samples)
+        if self.seed_sequence is not None:
+            seeds = spawn_seeds(self.seed_sequence.spawn(1)[0], len(inputs))
+        else:
+            seeds = [None] * len(inputs)
+        for input, seed in zip(inputs, seeds):
+            arguments.append((self.sampler, observations, input, num_samples, seed))
 
         return arguments
 
@@ -37,20 +54,23 @@ class ParallelSampler:
 
     @torch.no_grad()
     def sample(self, observations, num_samples, thetas=None):
-        assert(thetas is None or len(thetas) is self.chains)
+        assert(thetas is None or len(thetas) == self.chains)
         self.sampler.reset()
         if thetas is None:
             inputs = self._prepare_inputs()
-        pool = Pool(processes=self.workers)
+        else:
+            inputs = thetas
         arguments = self._prepare_arguments(observations, inputs, num_samples)
-        chains = pool.map(self.sample_chain, arguments)
-        del pool
+        with Pool(processes=self.workers, initializer=seed_process) as pool:
+            chains = pool.map(self.sample_chain, arguments)
 
         return chains
 
     @staticmethod
     def sample_chain(arguments):
-        sampler, observations, input, num_samples = arguments
+        sampler, observations, input, num_samples, seed = arguments
+        if seed is not None:
+            seed_process(seed)
         chain = sampler.sample(observations, input, num_samples)
 
         return chain
@@ -138,15 +158,29 @@ class AALRMetropolisHastings(MarkovChainMonteCarlo):
     def __init__(self, prior, ratio_estimator, transition):
         super(AALRMetropolisHastings, self).__init__(prior)
         self.denominator = None
+        self.embedded_outputs = None
+        self.observations = None
         self.prior = prior
         self.ratio_estimator = ratio_estimator
         self.transition = transition
 
+    def _embed_outputs(self, outputs):
+        # The observations are fixed throughout the chain, embed them once.
+        if self.observations is not outputs:
+            self.embedded_outputs = self.ratio_estimator.embed(outputs=outputs)
+            self.observations = outputs
+
+        return self.embedded_outputs
+
     def _compute_ratio(self, input, outputs):
         num_observations = outputs.shape[0]
         inputs = input.repeat(num_observations, 1)
         inputs = inputs.to(hypothesis.accelerator)
-        _, log_ratios = self.ratio_estimator(inputs=inputs, outputs=outputs)
+        if hasattr(self.ratio_estimator, "embed"):
+            embedded_inputs = self.ratio_estimator.embed(inputs=inputs)
+            log_ratios = self.ratio_estimator.score(**embedded_inputs, **self._embed_outputs(outputs))
+        else:
+            _, log_ratios = self.ratio_estimator(inputs=inputs, outputs=outputs)
 
         return log_ratios.sum().cpu()
 
@@ -14,6 +14,23 @@ class BaseRatioEstimator(torch.nn.Module):
 
         return log_ratios.sigmoid(), log_ratios
 
+    def embed(self, **kwargs):
+        r"""Embeds the random variables, such that
+        ``score(**embed(**kwargs))`` equals ``log_ratio(**kwargs)``.
+
+        Every random variable is embedded independently, and its embedding is
+        row-aligned with it. Therefore, ``embed`` accepts any subset of the
+        random variables, and embeddings can be reused across permutations
+        (or other gathers) of the batch. Estimators with expensive heads
+        override this method together with ``score``. By default, the random
+        variables are returned as is.
+        """
+        return kwargs
+
+    def score(self, **kwargs):
+        r"""Computes the log ratios of the embedded random variables."""
+        return self.log_ratio(**kwargs)
+
     def log_ratio(self, **kwargs):
         raise NotImplementedError
 
@@ -75,26 +92,70 @@ class RatioEstimatorEnsemble(BaseRatioEstimator):
 
 
 
+class FullPrecisionLoss(torch.nn.Module):
+    r"""Evaluates ``loss`` in single precision, outside of autocast regions.
+
+    Binary cross-entropies are unstable (and refused by autocast) in reduced
+    precision.
+    """
+
+    def __init__(self, loss):
+        super(FullPrecisionLoss, self).__init__()
+        self.loss = loss
+
+    def forward(self, input, target):
+        with torch.autocast(device_type=input.device.type, enabled=False):
+            return self.loss(input.float(), target.float())
+
+
+
 class BaseCriterion(torch.nn.Module):
+    r"""Base criterion contrasting dependent and independent samples.
+
+    Setting ``fused`` scores the dependent and independent batches in a
+    single pass of ``BaseRatioEstimator.score`` (the trunk) over the
+    concatenated embeddings, instead of two separate passes. The embedding
+    heads, which hold the normalization layers of the convolutional
+    estimators, embed every sample once either way. Only normalization
+    layers in the trunk see both batches at once, as does the whole
+    estimator when it does not implement ``embed`` and ``score``.
+
+    By default, every dependent sample is contrasted with a single
+    independent sample, obtained by permuting the batch. Setting
+    ``negatives`` to ``K > 1`` contrasts it with ``K`` independent samples,
+    obtained by rolling the (embedded) independent groups with ``K``
+    distinct shifts. Setting it to ``"all"`` contrasts it with all other
+    samples in the batch, which is only sensible for small batches.
+
+    The random variables are embedded once (see ``BaseRatioEstimator.embed``)
+    and the embeddings are reused by all independent samples.
+    """
+
+    NEGATIVES_ALL = "all"
 
     def __init__(self,
         estimator,
         denominator,
         batch_size=hypothesis.default.batch_size,
-        logits=False):
+        fused=False,
+        logits=False,
+        negatives=1):
         super(BaseCriterion, self).__init__()
         if logits:
-            self.criterion = torch.nn.BCEWithLogitsLoss()
+            self.criterion = FullPrecisionLoss(torch.nn.BCEWithLogitsLoss())
             self._forward = self._forward_with_logits
         else:
-            self.criterion = torch.nn.BCELoss()
+            self.criterion = FullPrecisionLoss(torch.nn.BCELoss())
             self._forward = self._forward_without_logits
         self.batch_size = batch_size
         self.estimator = estimator
+        self.fused = fused
         self.independent_random_variables = self._derive_independent_random_variables(denominator)
+        self.negatives = negatives
+        self.num_negatives = self._derive_num_negatives(negatives)
         self.ones = torch.ones(self.batch_size, 1)
         self.random_variables = self._derive_random_variables(denominator)
-        self.zeros = torch.zeros(self.batch_size, 1)
+        self.zeros = torch.zeros(self.batch_size * self.num_negatives, 1)
 
     def _derive_random_variables(self, denominator):
         random_variables = denominator.replace(hypothesis.default.dependent_delimiter, " ") \
@@ -111,24 +172,89 @@ class BaseCriterion(torch.nn.Module):
 
         return groups
 
+    def _derive_num_negatives(self, negatives):
+        if negatives == BaseCriterion.NEGATIVES_ALL:
+            if len(self.independent_random_variables) != 2:
+                raise ValueError("Contrasting all pairs requires exactly two independent groups.")
+            return self.batch_size - 1
+        negatives = int(negatives)
+        if not 1 <= negatives < self.batch_size:
+            raise ValueError("The number of negatives should be in [1, batch_size).")
+
+        return negatives
+
+    def _negative_indices(self):
+        r"""Row indices of every independent group in the independent batch."""
+        n = self.batch_size
+        if self.negatives == 1:
+            return [torch.randperm(n) for _ in self.independent_random_variables]
+        identity = torch.arange(n)
+        indices = [identity.repeat(self.num_negatives)]
+        for _ in self.independent_random_variables[1:]:
+            if self.negatives == BaseCriterion.NEGATIVES_ALL:
+                shifts = torch.arange(1, n) # All pairs (i, j) with i != j.
+            else:
+                shifts = torch.randperm(n - 1)[:self.num_negatives] + 1
+            indices.append(((identity.view(1, -1) + shifts.view(-1, 1)) % n).view(-1))
+
+        return indices
+
+    def _embed(self, kwargs):
+        # Estimators without the embedding interface (e.g., data parallel
+        # models) are evaluated on the gathered random variables instead.
+        if hasattr(self.estimator, "embed"):
+            return self.estimator.embed(**kwargs)
+
+        return kwargs
+
+    def _score(self, embeddings):
+        if hasattr(self.estimator, "score"):
+            return self.estimator.score(**embeddings)
+        _, log_ratios = self.estimator(**embeddings)
+
+        return log_ratios
+
+    def _evaluate(self, kwargs):
+        r"""Evaluates the estimator on the dependent and the independent batch.
+
+        The random variables are embedded once. The independent batch
+        gathers the embeddings, such that (convolutional) heads are not
+        evaluated again. Returns the outputs and log ratios of both batches.
+        """
+        n = self.batch_size
+        embeddings = self._embed(kwargs)
+        if self.fused:
+            # The first rows form the dependent batch, the others the independent batch.
+            identity = torch.arange(n)
+            fused = dict(embeddings)
+            for group, indices in zip(self.independent_random_variables, self._negative_indices()):
+                indices = torch.cat([identity, indices])
+                for variable in group:
+                    fused[variable] = embeddings[variable][indices]
+            log_ratios = self._score(fused)
+            log_ratios_dependent, log_ratios_independent = log_ratios[:n], log_ratios[n:]
+        else:
+            independent = dict(embeddings)
+            for group, indices in zip(self.independent_random_variables, self._negative_indices()):
+                for variable in group:
+                    independent[variable] = embeddings[variable][indices] # Make variable independent.
+            log_ratios_dependent = self._score(embeddings)
+            log_ratios_independent = self._score(independent)
+
+        # Log ratios computed in reduced precision (autocast) are promoted.
+        log_ratios_dependent = log_ratios_dependent.float()
+        log_ratios_independent = log_ratios_independent.float()
+
+        return (log_ratios_dependent.sigmoid(), log_ratios_dependent), (log_ratios_independent.sigmoid(), log_ratios_independent)
+
     def _forward_without_logits(self, **kwargs):
-        y_dependent, _ = self.estimator(**kwargs)
-        for group in self.independent_random_variables:
-            random_indices = torch.randperm(self.batch_size)
-            for variable in group:
-                kwargs[variable] = kwargs[variable][random_indices] # Make variable independent.
-        y_independent, _ = self.estimator(**kwargs)
+        (y_dependent, _), (y_independent, _) = self._evaluate(kwargs)
         loss = self.criterion(y_dependent, self.ones) + self.criterion(y_independent, self.zeros)
 
         return loss
 
     def _forward_with_logits(self, **kwargs):
-        _, y_dependent = self.estimator(**kwargs)
-        for group in self.independent_random_variables:
-            random_indices = torch.randperm(self.batch_size)
-            for variable in group:
-                kwargs[variable] = kwargs[variable][random_indices] # Make variable independent.
-        _, y_independent = self.estimator(**kwargs)
+        (_, y_dependent), (_, y_independent) = self._evaluate(kwargs)
         loss = self.criterion(y_dependent, self.ones) + self.criterion(y_independent, self.zeros)
 
         return loss
@@ -158,36 +284,29 @@ class BaseConservativeCriterion(BaseCriterion):
         denominator,
         batch_size=hypothesis.default.batch_size,
         beta=0.001,
-        logits=False):
+        fused=False,
+        logits=False,
+        negatives=1):
         super(BaseConservativeCriterion, self).__init__(
             estimator=estimator,
             denominator=denominator,
             batch_size=batch_size,
-            logits=logits)
+            fused=fused,
+            logits=logits,
+            negatives=negatives)
         self.beta = beta
 
     def _forward_without_logits(self, **kwargs):
         beta = self.beta
-        y_dependent, _ = self.estimator(**kwargs)
-        for group in self.independent_random_variables:
-            random_indices = torch.randperm(self.batch_size)
-            for variable in group:
-                kwargs[variable] = kwargs[variable][random_indices] # Make variable independent.
-        y_independent, _ = self.estimator(**kwargs)
-        loss = ((1 - beta) * self.criterion(y_dependent, self.ones) + beta * self.criterion(y_independent, self.ones)) + self.criterion(y_independent, self.zeros)
+        (y_dependent, _), (y_independent, _) = self._evaluate(kwargs)
+        loss = ((1 - beta) * self.criterion(y_dependent, self.ones) + beta * self.criterion(y_independent, torch.ones_like(y_independent))) + self.criterion(y_independent, self.zeros)
 
         return loss
 
     def _forward_with_logits(self, **kwargs):
         beta = self.beta
-        _, y_dependent = self.estimator(**kwargs)
-        for group in self.independent_random_variables:
-            random_indices = torch.randperm(self.batch_size)
-            for variable in group:
-                kwargs[variable] = kwargs[variable][random_indices] # Make variable independent.
-        _, y_independent = self.estimator(**kwargs)
-        loss = ((1 - beta) * self.criterion(y_dependent, self.ones) + beta * self.criterion(y_independent, self.ones)) + self.criterion(y_independent, self.zeros)
-
+        (_, y_dependent), (_, y_independent) = self._evaluate(kwargs)
+        loss = ((1 - beta) * self.criterion(y_dependent, self.ones) + beta * self.criterion(y_independent, torch.ones_like(y_independent))) + self.criterion(y_independent, self.zeros)
 
         return loss
 
@@ -199,35 +318,30 @@ class BaseExperimentalCriterion(BaseCriterion):
         denominator,
         batch_size=hypothesis.default.batch_size,
         beta=1.0,
-        logits=False):
+        fused=False,
+        logits=False,
+        negatives=1):
         super(BaseExperimentalCriterion, self).__init__(
             estimator=estimator,
             denominator=denominator,
             batch_size=batch_size,
-            logits=logits)
+            fused=fused,
+            logits=logits,
+            negatives=negatives)
         self.beta = beta
         self.base = np.log(4)
 
     def _forward_without_logits(self, **kwargs):
-        y_dependent, log_ratios = self.estimator(**kwargs)
-        for group in self.independent_random_variables:
-            random_indices = torch.randperm(self.batch_size)
-            for variable in group:
-                kwargs[variable] = kwargs[variable][random_indices] # Make variable independent.
-        y_independent, _ = self.estimator(**kwargs)
+        (y_dependent, log_ratios), (y_independent, _) = self._evaluate(kwargs)
         loss = self.criterion(y_dependent, self.ones) + self.criterion(y_independent, self.zeros)
         loss = loss + self.beta * ((self.base - loss.detach()).abs() / 2 - log_ratios.mean()) ** 2
 
         return loss
 
     def _forward_with_logits(self, **kwargs):
-        _, y_dependent = self.estimator(**kwargs)
-        for group in self.independent_random_variables:
-            random_indices = torch.randperm(self.batch_size)
-            for variable in group:
-                kwargs[variable] = kwargs[variable][random_indices] # Make variable independent.
-        _, y_independent = self.estimator(**kwargs)
+        (_, y_dependent), (_, y_independent) = self._evaluate(kwargs)
         loss = self.criterion(y_dependent, self.ones) + self.criterion(y_independent, self.zeros)
+        log_ratios = y_dependent
         loss = loss + self.beta * ((self.base - loss.detach()).abs() / 2 - log_ratios.mean()) ** 2
 
         return loss
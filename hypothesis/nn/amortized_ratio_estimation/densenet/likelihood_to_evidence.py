@@ -52,9 +52,19 @@ class LikelihoodToEvidenceRatioEstimatorDenseNet(BaseLikelihoodToEvidenceRatioEs
             layers=trunk_layers,
             transform_output=None)
 
-    def log_ratio(self, inputs, outputs):
-        z_outputs = self.head(outputs)
-        z = torch.cat([inputs, z_outputs], dim=1)
+    def embed(self, **kwargs):
+        embeddings = dict(kwargs)
+        if "outputs" in kwargs:
+            outputs = kwargs["outputs"]
+            embeddings["outputs"] = self.head(outputs).view(outputs.shape[0], -1)
+
+        return embeddings
+
+    def score(self, inputs, outputs):
+        z = torch.cat([inputs, outputs], dim=1)
         log_ratios = self.trunk(z)
 
         return log_ratios
+
+    def log_ratio(self, inputs, outputs):
+        return self.score(**self.embed(inputs=inputs, outputs=outputs))
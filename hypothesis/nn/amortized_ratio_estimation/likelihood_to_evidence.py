@@ -17,12 +17,16 @@ class LikelihoodToEvidenceCriterion(BaseCriterion):
     def __init__(self,
         estimator,
         batch_size=hypothesis.default.batch_size,
-        logits=False):
+        fused=False,
+        logits=False,
+        negatives=1):
         super(LikelihoodToEvidenceCriterion, self).__init__(
             batch_size=batch_size,
             denominator=DENOMINATOR,
             estimator=estimator,
-            logits=logits)
+            fused=fused,
+            logits=logits,
+            negatives=negatives)
 
 
 
@@ -32,12 +36,17 @@ class ConservativeLikelihoodToEvidenceCriterion(BaseConservativeCriterion):
         estimator,
         beta=0.001,
         batch_size=hypothesis.default.batch_size,
-        logits=False):
+        fused=False,
+        logits=False,
+        negatives=1):
         super(ConservativeLikelihoodToEvidenceCriterion, self).__init__(
             batch_size=batch_size,
+            beta=beta,
             denominator=DENOMINATOR,
             estimator=estimator,
-            logits=logits)
+            fused=fused,
+            logits=logits,
+            negatives=negatives)
 
 
 
@@ -13,12 +13,16 @@ class MutualInformationCriterion(BaseCriterion):
     def __init__(self,
         estimator,
         batch_size=hypothesis.default.batch_size,
-        logits=False):
+        fused=False,
+        logits=False,
+        negatives=1):
         super(MutualInformationCriterion, self).__init__(
             batch_size=batch_size,
-            denominator=LikelihoodToEvidenceCriterion.DENOMINATOR,
+            denominator=MutualInformationCriterion.DENOMINATOR,
             estimator=estimator,
-            logits=logits)
+            fused=fused,
+            logits=logits,
+            negatives=negatives)
 
 
 
@@ -69,13 +69,22 @@ def build_ratio_estimator(random_variables, **kwargs):
                 layers=trunk_layers,
                 transform_output=None)
 
-        def log_ratio(self, **kwargs):
-            z_head = self.head(kwargs[convolve_variable]).view(-1, self.embedding_dimensionality)
-            tensors = [kwargs[k].view(v) for k, v in trunk_random_variables.items()]
-            tensors.append(z_head)
+        def embed(self, **kwargs):
+            embeddings = {k: kwargs[k].view(v) for k, v in trunk_random_variables.items() if k in kwargs}
+            if convolve_variable in kwargs:
+                embeddings[convolve_variable] = self.head(kwargs[convolve_variable]).view(-1, self.embedding_dimensionality)
+
+            return embeddings
+
+        def score(self, **kwargs):
+            tensors = [kwargs[k] for k in trunk_random_variables]
+            tensors.append(kwargs[convolve_variable])
             features = torch.cat(tensors, dim=1)
             log_ratios = self.trunk(features)
 
             return log_ratios
 
+        def log_ratio(self, **kwargs):
+            return self.score(**self.embed(**kwargs))
+
     return RatioEstimator
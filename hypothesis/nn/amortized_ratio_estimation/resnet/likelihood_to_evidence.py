@@ -45,14 +45,14 @@ class LikelihoodToEvidenceRatioEstimatorResNet(BaseLikelihoodToEvidenceRatioEsti
             dilate=dilate,
             groups=groups,
             in_planes=in_planes,
-            shape_xs=shape_xs,
+            shape_xs=shape_outputs,
             width_per_group=width_per_group)
         # Check if custom trunk settings have been defined.
         if trunk_activation is None:
             trunk_activation = activation
         # Construct the trunk of the network.
         dimensionality = self.head.embedding_dimensionality() + compute_dimensionality(shape_inputs)
-        self.trunk = MLP(
+        self.trunk = MultiLayeredPerceptron(
             shape_xs=(dimensionality,),
             shape_ys=(1,),
             activation=trunk_activation,
@@ -60,8 +60,18 @@ class LikelihoodToEvidenceRatioEstimatorResNet(BaseLikelihoodToEvidenceRatioEsti
             layers=trunk_layers,
             transform_output=None)
 
-    def log_ratio(self, inputs, outputs):
-        z_head = self.head(outputs)
-        features = torch.cat([inputs, z_head])
+    def embed(self, **kwargs):
+        embeddings = dict(kwargs)
+        if "outputs" in kwargs:
+            outputs = kwargs["outputs"]
+            embeddings["outputs"] = self.head(outputs).view(outputs.shape[0], -1)
+
+        return embeddings
+
+    def score(self, inputs, outputs):
+        features = torch.cat([inputs, outputs], dim=1)
 
         return self.trunk(features)
+
+    def log_ratio(self, inputs, outputs):
+        return self.score(**self.embed(inputs=inputs, outputs=outputs))
@@ -44,6 +44,7 @@ class DenseNetHead(torch.nn.Module):
         self.channels = channels
         self.convolution_bias = convolution_bias
         self.in_planes = in_planes
+        self.memory_format = torch.contiguous_format
         self.shape_xs = shape_xs
         # Network structure
         self.network_head = self._build_head()
@@ -141,6 +142,7 @@ class DenseNetHead(torch.nn.Module):
         return self.embedding_dim
 
     def forward(self, x):
+        x = x.contiguous(memory_format=self.memory_format)
         z = self.network_head(x)
         z = self.network_body(z)
 
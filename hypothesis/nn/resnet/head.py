@@ -52,6 +52,7 @@ class ResNetHead(torch.nn.Module):
         self.shape_xs = shape_xs
         self.shape_in = tuple([-1, channels]) + shape_xs
         self.width_per_group = width_per_group
+        self.memory_format = torch.contiguous_format
         # Network structure
         self.network_head = self._build_head()
         self.network_body = self._build_body()
@@ -167,7 +168,7 @@ class ResNetHead(torch.nn.Module):
         return self.embedding_dim
 
     def forward(self, x):
-        x = x.view(self.shape_in)
+        x = x.view(self.shape_in).contiguous(memory_format=self.memory_format)
         z = self.network_head(x)
         z = self.network_body(z)
 
@@ -25,6 +25,21 @@ def allocate_output_transform(transformation, shape):
     return mapping
 
 
+def channels_last(module):
+    r"""Converts the 2-dimensional convolutional heads in ``module`` to the
+    channels-last memory format.
+
+    Both the parameters and the inputs of the heads are converted, other
+    modules are not affected.
+    """
+    for m in module.modules():
+        if hasattr(m, "memory_format") and getattr(m, "dimensionality", None) == 2:
+            m.memory_format = torch.channels_last
+            m.to(memory_format=torch.channels_last)
+
+    return module
+
+
 def compute_dimensionality(shape):
     dimensionality = 1
     for dim in shape:
@@ -1,6 +1,12 @@
+import os
+import time
 import torch
 
+from collections import namedtuple
+from hypothesis.util.seeding import seed_process
+from hypothesis.util.seeding import spawn_seeds
 from multiprocessing import Pool
+from numpy.random import SeedSequence
 
 
 
@@ -42,43 +48,209 @@ class Simulator(torch.nn.Module):
 
 
 
+_worker_simulator = None
+r"""Simulator of the current pool worker, set once by ``_initialize_worker``."""
+
+
+def _initialize_worker(simulator):
+    global _worker_simulator
+    _worker_simulator = simulator
+    # Do not share the random state inherited from the parent.
+    seed_process()
+
+
+
+ChunkStatistics = namedtuple("ChunkStatistics", ["base", "rows", "duration", "worker"])
+r"""Timing of a single simulated chunk: the index of its first row, the
+number of rows, the simulation time in seconds and the pid of the worker."""
+
+
+
 class ParallelSimulator(Simulator):
+    r"""Distributes the rows of a simulation batch over a pool of workers.
+
+    The pool is started on the first call and reused by subsequent calls.
+    Every worker receives the simulator once at start-up, after which only
+    the chunks of the arguments are sent. The pool is released by ``close``,
+    or by using the simulator as a context manager::
+
+        with ParallelSimulator(simulator, workers=4) as parallel_simulator:
+            outputs = parallel_simulator(inputs=inputs)
+
+    Args:
+        simulator (Simulator): The simulator to parallelize.
+        workers (int): Number of worker processes.
+        chunk_size (int, optional): Fixed number of rows per chunk. By default
+            the rows are spread evenly over the workers. When ``seed`` is
+            specified, it has to be a multiple of ``seed_block_size``.
+        shared_memory (bool): Let the workers write their outputs directly
+            into a shared-memory tensor instead of sending them back. The
+            output shape is derived from the first call.
+        dynamic (bool): Schedule many small chunks through ``imap_unordered``
+            so that idle workers pick up the remaining work. Useful when the
+            simulation cost depends on the inputs. Results are re-ordered,
+            the outputs are in the order of the inputs.
+        seed (int, optional): Root seed. Every block of ``seed_block_size``
+            rows of every call is simulated with its own random stream
+            derived from this seed. The chunks are aligned to the blocks,
+            which makes the outputs reproducible independently of the
+            number of workers, the chunk size and the schedule. Without a
+            seed, every worker is seeded with fresh entropy at start-up.
+        seed_block_size (int): Number of rows sharing a random stream when
+            ``seed`` is specified.
+
+    Reproducibility constrains the parallelism: a block is never split over
+    chunks, so a seeded call is distributed over at most
+    ``ceil(rows / seed_block_size)`` chunks. Small blocks balance the load
+    better, while large blocks let the simulator process more rows per
+    (vectorized) call. Calls with fewer than ``workers * seed_block_size``
+    rows leave workers idle.
+
+    The timings of the chunks of the most recent call are available in
+    ``chunk_statistics`` as a list of ``ChunkStatistics``.
+    """
+
+    DYNAMIC_CHUNKS_PER_WORKER = 8
 
-    def __init__(self, simulator, workers=2):
+    def __init__(self, simulator, workers=2, chunk_size=None, shared_memory=False, dynamic=False, seed=None, seed_block_size=16):
         super(ParallelSimulator, self).__init__()
+        seed_block_size = max(1, int(seed_block_size))
+        if seed is not None and chunk_size is not None and int(chunk_size) % seed_block_size != 0:
+            raise ValueError("The chunk size", chunk_size, "is not a multiple of the seed block size", seed_block_size)
+        if seed is not None:
+            self.seed_sequence = SeedSequence(seed)
+        else:
+            self.seed_sequence = None
+        self.chunk_size = chunk_size
+        self.chunk_statistics = []
+        self.dynamic = dynamic
+        self.output_specification = None
+        self.pool = None
+        self.seed_block_size = seed_block_size
+        self.shared_memory = shared_memory
         self.simulator = simulator
         self.workers = workers
 
+    def _allocate_pool(self):
+        if self.pool is None:
+            self.pool = Pool(
+                processes=self.workers,
+                initializer=_initialize_worker,
+                initargs=(self.simulator,))
+
+        return self.pool
+
+    def _compute_chunk_size(self, rows):
+        if self.chunk_size is not None:
+            chunk_size = max(1, int(self.chunk_size))
+        else:
+            # Spread the rows evenly, in the static case never allocate more chunks than workers.
+            num_chunks = self.workers
+            if self.dynamic:
+                num_chunks *= self.DYNAMIC_CHUNKS_PER_WORKER
+            chunk_size = max(1, -(-rows // num_chunks))
+        # Seeded chunks consist of complete blocks (explicit chunk sizes are validated).
+        if self.seed_sequence is not None:
+            chunk_size = -(-chunk_size // self.seed_block_size) * self.seed_block_size
+
+        return chunk_size
+
     @torch.no_grad()
     def _prepare_arguments(self, **kwargs):
         arguments = []
 
         # Determine the number of chunks
         rows = kwargs[list(kwargs.keys())[0]].shape[0]
-        chunk_size = rows // self.workers
-        if chunk_size == 0:
-            chunk_size = 1
+        chunk_size = self._compute_chunk_size(rows)
         for base in range(0, rows, chunk_size):
             argument = {}
             for k, v in kwargs.items():
                 argument[k] = v[base:base + chunk_size]
-            arguments.append((self.simulator, argument))
+            arguments.append((base, argument))
 
         return arguments
 
+    def _chunk_seeds(self, seeds, base, chunk_size):
+        if seeds is None:
+            return None
+        first = base // self.seed_block_size
+
+        return seeds[first:first + chunk_size // self.seed_block_size]
+
+    def _allocate_shared_outputs(self, rows):
+        shape, dtype = self.output_specification
+        outputs = torch.empty((rows,) + shape, dtype=dtype)
+
+        return outputs.share_memory_()
+
     @torch.no_grad()
     def forward(self, **kwargs):
-        pool = Pool(processes=self.workers)
+        pool = self._allocate_pool()
+        rows = kwargs[list(kwargs.keys())[0]].shape[0]
+        # Check if the workers can write into a shared-memory tensor.
+        if self.shared_memory and self.output_specification is not None:
+            outputs = self._allocate_shared_outputs(rows)
+        else:
+            outputs = None
         arguments = self._prepare_arguments(**kwargs)
-        outputs = pool.map(self._simulate, arguments)
-        pool.close()
-        pool.join()
-        del pool
+        # Derive the random streams of the blocks, if a root seed has been specified.
+        block_size = self.seed_block_size
+        if self.seed_sequence is not None:
+            seeds = spawn_seeds(self.seed_sequence.spawn(1)[0], -(-rows // block_size))
+        else:
+            seeds = None
+        chunk_size = self._compute_chunk_size(rows)
+        arguments = [(outputs, base, argument, self._chunk_seeds(seeds, base, chunk_size), block_size)
+            for base, argument in arguments]
+        if self.dynamic:
+            results = list(pool.imap_unordered(self._simulate, arguments))
+            results.sort(key=lambda result: result[0])
+        else:
+            results = pool.map(self._simulate, arguments)
+        self.chunk_statistics = [ChunkStatistics(base, n, duration, worker)
+            for base, _, n, duration, worker in results]
+        if outputs is None:
+            outputs = torch.cat([x for _, x, _, _, _ in results], dim=0)
+            self.output_specification = (tuple(outputs.shape[1:]), outputs.dtype)
+
+        return outputs
+
+    def close(self):
+        r"""Shuts down the worker pool, if one has been started."""
+        pool = getattr(self, "pool", None)
+        if pool is not None:
+            pool.close()
+            pool.join()
+        self.pool = None
+
+    def terminate(self):
+        self.close()
+
+    def __enter__(self):
+        return self
 
-        return torch.cat(outputs, dim=0)
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
 
     @staticmethod
     def _simulate(arguments):
-        simulator, kwargs = arguments
+        outputs, base, kwargs, seeds, block_size = arguments
+        start = time.time()
+        if seeds is None:
+            x = _worker_simulator(**kwargs)
+        else:
+            # Simulate every block with its own random stream.
+            blocks = []
+            for index, seed in enumerate(seeds):
+                seed_process(seed)
+                blocks.append(_worker_simulator(**{k: v[index * block_size:(index + 1) * block_size]
+                    for k, v in kwargs.items()}))
+            x = torch.cat(blocks, dim=0)
+        duration = time.time() - start
+        n = x.shape[0]
+        # Check if the outputs have to be written in shared memory.
+        if outputs is not None:
+            outputs[base:base + n] = x
+            x = None
 
-        return simulator(**kwargs)
+        return base, x, n, duration, os.getpid()
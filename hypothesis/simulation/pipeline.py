@@ -0,0 +1,142 @@
+import json
+import numpy as np
+import os
+import queue
+import threading
+import torch
+
+
+
+class SimulationPipeline:
+    r"""Simulates a dataset directly to disk.
+
+    Draws inputs from the prior and simulates them in batches. The
+    conversion of the simulated tensors to NumPy arrays and the disk writes
+    happen in two background threads connected through bounded queues,
+    such that they overlap with the simulation of the next batches.
+
+    The pipeline produces ``inputs.npy`` and ``outputs.npy`` in
+    ``directory``, readable by ``hypothesis.util.data.numpy.SimulationDataset``.
+    Both files are preallocated, and the number of completed rows is recorded
+    in ``progress.json`` after every flushed batch. Running the pipeline
+    again on the same directory resumes after the last completed batch.
+
+    Example usage::
+
+        pipeline = SimulationPipeline(simulator, prior, "data/train")
+        pipeline.run(size=1000000)
+    """
+
+    INPUTS = "inputs.npy"
+    OUTPUTS = "outputs.npy"
+    PROGRESS = "progress.json"
+
+    def __init__(self, simulator, prior, directory, batch_size=1024, queue_size=4):
+        self.batch_size = int(batch_size)
+        self.directory = directory
+        self.exception = None
+        self.prior = prior
+        self.queue_size = int(queue_size)
+        self.simulator = simulator
+
+    def _path(self, file_name):
+        return os.path.join(self.directory, file_name)
+
+    def completed(self):
+        r"""Returns the number of rows which have been written to disk."""
+        path = self._path(self.PROGRESS)
+        if not os.path.exists(path):
+            return 0
+        with open(path, "r") as fd:
+            return json.load(fd)["rows"]
+
+    def _store_progress(self, rows, size):
+        path = self._path(self.PROGRESS)
+        temporary_path = path + ".tmp"
+        with open(temporary_path, "w") as fd:
+            json.dump({"rows": rows, "size": size}, fd)
+        os.replace(temporary_path, path)
+
+    def _allocate(self, file_name, shape, dtype):
+        path = self._path(file_name)
+        if os.path.exists(path):
+            datamap = np.load(path, mmap_mode="r+")
+            if datamap.shape != shape:
+                raise ValueError("The existing file", path, "does not have the expected shape", shape)
+        else:
+            datamap = np.lib.format.open_memmap(path, mode="w+", dtype=dtype, shape=shape)
+
+        return datamap
+
+    @torch.no_grad()
+    def _simulate(self, n):
+        inputs = self.prior.sample(torch.Size([n]))
+        outputs = self.simulator(inputs=inputs)
+
+        return inputs, outputs
+
+    def _convert(self, queue_in, queue_out):
+        try:
+            while True:
+                item = queue_in.get()
+                if item is not None:
+                    base, inputs, outputs = item
+                    item = (base, inputs.cpu().numpy(), outputs.cpu().numpy())
+                queue_out.put(item)
+                if item is None:
+                    break
+        except Exception as e:
+            self.exception = e
+            queue_out.put(None)
+            # Drain the queue to unblock the producer.
+            while queue_in.get() is not None:
+                pass
+
+    def _write(self, queue_in, size):
+        datamap_inputs = None
+        datamap_outputs = None
+        try:
+            while True:
+                item = queue_in.get()
+                if item is None:
+                    break
+                base, inputs, outputs = item
+                if datamap_inputs is None:
+                    datamap_inputs = self._allocate(self.INPUTS, (size,) + inputs.shape[1:], inputs.dtype)
+                    datamap_outputs = self._allocate(self.OUTPUTS, (size,) + outputs.shape[1:], outputs.dtype)
+                datamap_inputs[base:base + len(inputs)] = inputs
+                datamap_outputs[base:base + len(outputs)] = outputs
+                datamap_inputs.flush()
+                datamap_outputs.flush()
+                self._store_progress(base + len(inputs), size)
+        except Exception as e:
+            self.exception = e
+            # Drain the queue to unblock the producers.
+            while queue_in.get() is not None:
+                pass
+
+    def run(self, size):
+        r"""Simulates (the remainder of) a dataset with ``size`` rows."""
+        os.makedirs(self.directory, exist_ok=True)
+        self.exception = None
+        queue_convert = queue.Queue(maxsize=self.queue_size)
+        queue_write = queue.Queue(maxsize=self.queue_size)
+        converter = threading.Thread(target=self._convert, args=(queue_convert, queue_write), daemon=True)
+        writer = threading.Thread(target=self._write, args=(queue_write, size), daemon=True)
+        converter.start()
+        writer.start()
+        try:
+            for base in range(self.completed(), size, self.batch_size):
+                if self.exception is not None:
+                    break
+                n = min(self.batch_size, size - base)
+                inputs, outputs = self._simulate(n)
+                queue_convert.put((base, inputs, outputs))
+        finally:
+            queue_convert.put(None)
+            converter.join()
+            writer.join()
+        if self.exception is not None:
+            raise self.exception
+
+        return self.completed()
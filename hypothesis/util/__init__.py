@@ -2,3 +2,8 @@ r""""""
 
 from hypothesis.util.loss import load_and_stack_losses
 from hypothesis.util.general import *
+from hypothesis.util.seeding import get_rng_state
+from hypothesis.util.seeding import seed_dataloader_worker
+from hypothesis.util.seeding import seed_process
+from hypothesis.util.seeding import set_rng_state
+from hypothesis.util.seeding import spawn_seeds
@@ -2,6 +2,9 @@ r""""""
 
 
 
+from hypothesis.util.data.batched_simulator_dataset import BatchedSimulatorDataset
+from hypothesis.util.data.device_loader import DeviceDataLoader
 from hypothesis.util.data.distribution_dataset import DistributionDataset
+from hypothesis.util.data.sampler import BatchIndexSampler
 from hypothesis.util.data.simulation_tensor_dataset import SimulationTensorDataset
 from hypothesis.util.data.simulator_dataset import SimulatorDataset
@@ -0,0 +1,118 @@
+import hypothesis
+import torch
+
+from hypothesis.util.seeding import seed_process
+from numpy.random import SeedSequence
+from torch.utils.data import IterableDataset
+from torch.utils.data import get_worker_info
+
+
+
+class BatchedSimulatorDataset(IterableDataset):
+    r"""Simulates complete batches on the fly.
+
+    Every step draws ``batch_size`` inputs from the prior at once and
+    forwards them through the simulator in a single call, such that the
+    batched code paths of the simulators are used. Rows with non-finite
+    outputs are considered failed simulations; they are dropped and the
+    batch is topped up with new simulations.
+
+    An epoch consists of ``size // batch_size`` batches, which are
+    distributed over the ``DataLoader`` workers. The dataset yields
+    complete batches, use it with ``DataLoader(dataset, batch_size=None)``.
+
+    Setting ``replay`` to ``K > 1`` keeps the simulations of an epoch in
+    memory and serves them (reshuffled) for ``K`` epochs before simulating
+    new ones. The buffer lives in the process iterating the dataset, which
+    requires ``num_workers=0`` or ``persistent_workers=True``.
+
+    Setting ``seed`` seeds every worker (and epoch) from a stream derived
+    from the root seed. Otherwise, pass
+    ``worker_init_fn=hypothesis.util.seed_dataloader_worker``.
+    """
+
+    MAX_FAILED_ATTEMPTS = 10
+
+    def __init__(self, simulator, prior,
+        size=1000000,
+        batch_size=hypothesis.default.batch_size,
+        replay=1,
+        seed=None):
+        super(BatchedSimulatorDataset, self).__init__()
+        self.batch_size = int(batch_size)
+        self.buffer = None
+        self.epoch = 0
+        self.prior = prior
+        self.replay = max(int(replay), 1)
+        self.seed = seed
+        self.simulator = simulator
+        self.size = int(size)
+
+    def _worker(self):
+        info = get_worker_info()
+        if info is None:
+            return 0, 1
+
+        return info.id, info.num_workers
+
+    @torch.no_grad()
+    def _simulate(self, n):
+        inputs = self.prior.sample(torch.Size([n]))
+        outputs = self.simulator(inputs=inputs)
+        passed = torch.isfinite(outputs.view(n, -1)).all(dim=1)
+        if not passed.all():
+            inputs = inputs[passed]
+            outputs = outputs[passed]
+
+        return inputs, outputs
+
+    def simulate_batch(self, batch_size=None):
+        r"""Simulates a batch of ``batch_size`` valid rows."""
+        if batch_size is None:
+            batch_size = self.batch_size
+        inputs, outputs = self._simulate(batch_size)
+        failures = 0
+        while len(inputs) < batch_size:
+            missing_inputs, missing_outputs = self._simulate(batch_size - len(inputs))
+            if len(missing_inputs) == 0:
+                failures += 1
+                if failures >= self.MAX_FAILED_ATTEMPTS:
+                    raise RuntimeError("The simulator repeatedly failed to produce finite outputs.")
+            inputs = torch.cat([inputs, missing_inputs])
+            outputs = torch.cat([outputs, missing_outputs])
+
+        return inputs, outputs
+
+    def _replay(self, num_batches):
+        inputs, outputs = self.buffer
+        indices = torch.randperm(len(inputs))
+        for index in range(num_batches):
+            batch = indices[index * self.batch_size:(index + 1) * self.batch_size]
+            yield inputs[batch], outputs[batch]
+
+    def _simulate_epoch(self, num_batches):
+        batches = []
+        for _ in range(num_batches):
+            batch = self.simulate_batch()
+            if self.replay > 1:
+                batches.append(batch)
+            yield batch
+        if self.replay > 1:
+            inputs, outputs = zip(*batches)
+            self.buffer = torch.cat(inputs), torch.cat(outputs)
+
+    def __iter__(self):
+        worker, workers = self._worker()
+        num_batches = len(range(worker, len(self), workers))
+        if self.seed is not None:
+            seed_process(SeedSequence([int(self.seed), worker, self.epoch]))
+        replay = self.buffer is not None and self.epoch % self.replay != 0
+        self.epoch += 1
+        if replay:
+            return self._replay(num_batches)
+        else:
+            return self._simulate_epoch(num_batches)
+
+    def __len__(self):
+        r"""Number of batches per epoch."""
+        return self.size // self.batch_size
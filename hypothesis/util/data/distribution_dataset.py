@@ -1,18 +1,135 @@
+import numpy as np
 import torch
 
+from numpy.random import SeedSequence
 from torch.utils.data import Dataset
 
 
 
 class DistributionDataset(Dataset):
-    r""""""
+    r"""Dataset of samples drawn from a distribution.
 
-    def __init__(self, distribution, size=1000000):
+    Samples are drawn in blocks of ``block_size`` rows with a single call to
+    ``distribution.sample``. Every block is seeded from ``seed``, the epoch
+    and the block index. Therefore, the samples are fixed within an epoch,
+    identical across ``DataLoader`` workers and reproducible. ``set_epoch``
+    (or ``refresh``) draws a new set of samples.
+
+    By default, the sampled blocks are kept until the epoch changes. Setting
+    ``buffer_size`` (in rows) stores the blocks in a fixed-size ring buffer
+    instead, evicting the oldest block when it is full. Evicted blocks are
+    resampled identically on access.
+    """
+
+    def __init__(self, distribution, size=1000000, block_size=65536, buffer_size=None, seed=None):
+        super(DistributionDataset, self).__init__()
+        self.size = int(size)
+        self.block_size = max(min(int(block_size), self.size), 1)
+        self.buffer_size = buffer_size
         self.distribution = distribution
-        self.size = size
+        self.epoch = 0
+        self.seed = SeedSequence(seed).entropy
+        self._reset()
+
+    def _reset(self):
+        self._blocks = {}
+        self._buffer = None
+        self._position = 0
+        self._slots = None
+
+    def set_epoch(self, epoch):
+        r"""Sets the epoch, and therefore the samples, of the dataset."""
+        if epoch != self.epoch:
+            self.epoch = epoch
+            self._reset()
+
+    def refresh(self):
+        r"""Draws new samples by advancing to the next epoch."""
+        self.set_epoch(self.epoch + 1)
+
+    def _sample_block(self, block):
+        start = block * self.block_size
+        n = min(self.block_size, self.size - start)
+        state = SeedSequence([self.seed, self.epoch, block]).generate_state(2, dtype=np.uint32)
+        with torch.random.fork_rng(devices=[]):
+            torch.manual_seed((int(state[0]) << 32) | int(state[1]))
+            return self.distribution.sample(torch.Size([n]))
+
+    def _store(self, block, samples):
+        num_slots = max(int(self.buffer_size) // self.block_size, 1)
+        if self._buffer is None:
+            shape = (num_slots * self.block_size,) + samples.shape[1:]
+            self._buffer = torch.empty(shape, dtype=samples.dtype, device=samples.device)
+            self._slots = [None] * num_slots
+        slot = self._position
+        self._position = (slot + 1) % num_slots
+        # Evict the block occupying the slot.
+        if self._slots[slot] is not None:
+            del self._blocks[self._slots[slot]]
+        start = slot * self.block_size
+        view = self._buffer[start:start + len(samples)]
+        view.copy_(samples)
+        self._slots[slot] = block
+
+        return view
+
+    def _block(self, block):
+        samples = self._blocks.get(block)
+        if samples is None:
+            samples = self._sample_block(block)
+            if self.buffer_size is not None:
+                samples = self._store(block, samples)
+            self._blocks[block] = samples
+
+        return samples
+
+    def get_batch(self, indices):
+        r"""Retrieves the samples at the specified (array of) indices."""
+        indices = np.asarray(indices, dtype=np.int64).reshape(-1) % self.size
+        blocks = indices // self.block_size
+        unique_blocks = np.unique(blocks)
+        if len(unique_blocks) == 1:
+            return self._block(int(unique_blocks[0]))[torch.from_numpy(indices % self.block_size)]
+        samples = None
+        for block in unique_blocks:
+            mask = blocks == block
+            values = self._block(int(block))[torch.from_numpy(indices[mask] % self.block_size)]
+            if samples is None:
+                samples = values.new_empty((len(indices),) + values.shape[1:])
+            samples[torch.from_numpy(mask)] = values
+
+        return samples
 
     def __getitem__(self, index):
-        return self.distribution.sample()
+        if isinstance(index, slice):
+            start, stop, step = index.indices(self.size)
+            if step != 1:
+                return self.get_batch(np.arange(start, stop, step))
+            return self._slice(start, stop)
+        elif not np.isscalar(index):
+            return self.get_batch(index)
+        block, offset = divmod(int(index) % self.size, self.block_size)
+
+        return self._copy(self._block(block)[offset])
+
+    def _copy(self, samples):
+        # Views into the ring buffer are overwritten on eviction.
+        if self.buffer_size is not None:
+            samples = samples.clone()
+
+        return samples
+
+    def _slice(self, start, stop):
+        pieces = []
+        while start < stop:
+            block, offset = divmod(start, self.block_size)
+            n = min(self.block_size - offset, stop - start)
+            pieces.append(self._copy(self._block(block)[offset:offset + n]))
+            start += n
+        if len(pieces) == 1:
+            return pieces[0]
+
+        return torch.cat(pieces)
 
     def __len__(self):
         return self.size
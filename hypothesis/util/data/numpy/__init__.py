@@ -1,6 +1,12 @@
+from .storage import CompressedStorage
 from .storage import InMemoryStorage
 from .storage import PersistentStorage
+from .storage import allocate_storage
 from .simulation_dataset import SimulationDataset
+from .util import compress
 from .util import compute_final_shape
 from .util import merge
 from .dataset import Dataset
+from .sharded import ShardWriter
+from .sharded import ShardedSimulationDataset
+from .util import prune
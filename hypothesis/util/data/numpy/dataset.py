@@ -2,8 +2,9 @@ import numpy as np
 import os
 import torch
 
-from hypothesis.util.data.numpy import InMemoryStorage
-from hypothesis.util.data.numpy import PersistentStorage
+from hypothesis.util.data.numpy import allocate_storage
+from hypothesis.util.data.numpy.storage import compute_block_size
+from hypothesis.util.data.numpy.storage import sort_indices
 from torch.utils.data import Dataset as BaseDataset
 
 
@@ -13,18 +14,19 @@ class Dataset(BaseDataset):
 
     def __init__(self, *paths, in_memory=True):
         super(Dataset, self).__init__()
-        if in_memory:
-            storage_type = InMemoryStorage
-        else:
-            storage_type = PersistentStorage
         if len(paths) > 1:
-            self.storages = [storage_type(path) for path in paths]
+            self.storages = [allocate_storage(path, in_memory=in_memory) for path in paths]
             self.retriever = self._retrieve_multi_storage
         else:
-            self.storage = storage_type(paths[0])
+            self.storage = allocate_storage(paths[0], in_memory=in_memory)
             self.retriever = self._retrieve_single_storage
             self.storages = [self.storage]
 
+    @property
+    def block_size(self):
+        r"""Number of contiguous rows to sample at once, or ``None``."""
+        return compute_block_size(self.storages)
+
     def _retrieve_multi_storage(self, index):
         return tuple(storage[index].unsqueeze(0) for storage in self.storages)
 
@@ -32,8 +34,23 @@ class Dataset(BaseDataset):
         return self.storage[index]
 
     def __getitem__(self, index):
+        if isinstance(index, (list, np.ndarray, torch.Tensor)):
+            return self.get_batch(index)
+
         return self.retriever(index)
 
+    def get_batch(self, indices):
+        r"""Retrieves the rows at ``indices`` with a single read per storage."""
+        indices, inverse = sort_indices(indices)
+        rows = tuple(storage[indices] for storage in self.storages)
+        # Restore the requested order.
+        if inverse is not None:
+            rows = tuple(x[inverse] for x in rows)
+        if len(self.storages) > 1:
+            return rows
+        else:
+            return rows[0]
+
     def __del__(self):
         if hasattr(self, "storages"):
             for index in range(len(self.storages)):
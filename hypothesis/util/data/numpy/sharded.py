@@ -0,0 +1,235 @@
+r"""Sharded simulation datasets.
+
+A sharded dataset is a directory holding fixed-size ``.npy`` shards for
+every random variable, together with a ``manifest.json`` describing the
+row counts, data types, shapes and checksums of the shards::
+
+    {"variables": {"inputs": {"dtype": "<f4", "shape": [2]}, ...},
+     "shards": [{"rows": 100000,
+                 "files": {"inputs": "inputs-00000.npy", ...},
+                 "checksums": {"inputs": "<sha256>", ...}}, ...]}
+
+Shards are only registered in the manifest once they are completely
+written, such that a ``ShardedSimulationDataset`` can be used while
+simulations are still being appended (see ``refresh``).
+"""
+
+import hashlib
+import json
+import numpy as np
+import os
+import torch
+
+from collections import OrderedDict
+from hypothesis.util.data.numpy.storage import PersistentStorage
+from hypothesis.util.data.numpy.storage import sort_indices
+from torch.utils.data import Dataset
+
+
+
+MANIFEST = "manifest.json"
+r"""Name of the manifest file of a sharded dataset."""
+
+
+def load_manifest(directory):
+    with open(os.path.join(directory, MANIFEST), "r") as fd:
+        return json.load(fd)
+
+
+def store_manifest(directory, manifest):
+    r"""Atomically replaces the manifest of the sharded dataset."""
+    path = os.path.join(directory, MANIFEST)
+    temporary_path = path + ".tmp"
+    with open(temporary_path, "w") as fd:
+        json.dump(manifest, fd, indent=2)
+        fd.flush()
+        os.fsync(fd.fileno())
+    os.replace(temporary_path, path)
+
+
+def checksum(path, chunk_size=1 << 24):
+    r"""Computes the SHA-256 checksum of the specified file."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as fd:
+        for chunk in iter(lambda: fd.read(chunk_size), b""):
+            digest.update(chunk)
+
+    return digest.hexdigest()
+
+
+def verify(directory):
+    r"""Checks the shards of the dataset against the checksums in the manifest.
+
+    Returns the list of corrupted files.
+    """
+    corrupted = []
+    manifest = load_manifest(directory)
+    for shard in manifest["shards"]:
+        for variable, file_name in shard["files"].items():
+            path = os.path.join(directory, file_name)
+            if not os.path.exists(path) or checksum(path) != shard["checksums"][variable]:
+                corrupted.append(path)
+
+    return corrupted
+
+
+
+class ShardWriter:
+    r"""Appends simulations to a sharded dataset.
+
+    Rows are buffered until ``shard_size`` rows are available, after which
+    the shard is written and registered in the manifest. The remaining rows
+    are written as a (smaller) shard by ``close``. Appending to an existing
+    dataset continues after its last shard.
+
+    Example usage::
+
+        with ShardWriter("data/train", shard_size=100000) as writer:
+            writer.append(inputs=inputs, outputs=outputs)
+    """
+
+    def __init__(self, directory, shard_size=100000):
+        self.buffers = OrderedDict()
+        self.buffered_rows = 0
+        self.directory = directory
+        self.shard_size = int(shard_size)
+        os.makedirs(directory, exist_ok=True)
+        if os.path.exists(os.path.join(directory, MANIFEST)):
+            self.manifest = load_manifest(directory)
+        else:
+            self.manifest = {"variables": {}, "shards": []}
+
+    def _register_variables(self, variables):
+        for k, v in variables.items():
+            specification = {"dtype": v.dtype.str, "shape": list(v.shape[1:])}
+            registered = self.manifest["variables"].setdefault(k, specification)
+            if registered != specification:
+                raise ValueError("Variable", k, "does not match the specification", registered)
+        if set(variables.keys()) != set(self.manifest["variables"].keys()):
+            raise ValueError("Expected the variables", list(self.manifest["variables"].keys()))
+
+    def _write_shard(self, rows):
+        shard = {"rows": rows, "files": {}, "checksums": {}}
+        index = len(self.manifest["shards"])
+        for k, buffers in self.buffers.items():
+            data = np.concatenate(buffers, axis=0)
+            self.buffers[k] = [data[rows:]]
+            file_name = "{}-{:05d}.npy".format(k, index)
+            path = os.path.join(self.directory, file_name)
+            np.save(path, data[:rows])
+            shard["files"][k] = file_name
+            shard["checksums"][k] = checksum(path)
+        self.buffered_rows -= rows
+        self.manifest["shards"].append(shard)
+        store_manifest(self.directory, self.manifest)
+
+    def append(self, **kwargs):
+        r"""Appends a batch of rows, specified per random variable."""
+        variables = OrderedDict()
+        for k in sorted(kwargs.keys()):
+            v = kwargs[k]
+            if torch.is_tensor(v):
+                v = v.detach().cpu().numpy()
+            variables[k] = np.asarray(v)
+        self._register_variables(variables)
+        for k, v in variables.items():
+            self.buffers.setdefault(k, []).append(v)
+        self.buffered_rows += len(next(iter(variables.values())))
+        while self.buffered_rows >= self.shard_size:
+            self._write_shard(self.shard_size)
+
+    def close(self):
+        r"""Writes the remaining rows as a final shard."""
+        if self.buffered_rows > 0:
+            self._write_shard(self.buffered_rows)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+
+class ShardedSimulationDataset(Dataset):
+    r"""Dataset over the shards of a sharded simulation dataset.
+
+    Global indices are mapped to shards through the prefix sum of the shard
+    sizes. Shards are opened lazily as memory-maps, of which at most
+    ``cache_size`` are kept open (least recently used). The dataset returns
+    the random variables in the order of ``variables``.
+    """
+
+    def __init__(self, directory, variables=("inputs", "outputs"), cache_size=8):
+        super(ShardedSimulationDataset, self).__init__()
+        self.cache_size = int(cache_size)
+        self.directory = directory
+        self.storages = OrderedDict()
+        self.variables = tuple(variables)
+        self.refresh()
+
+    def refresh(self):
+        r"""Reloads the manifest, making newly appended shards available."""
+        self.manifest = load_manifest(self.directory)
+        self.shards = self.manifest["shards"]
+        rows = [shard["rows"] for shard in self.shards]
+        self.offsets = np.concatenate([[0], np.cumsum(rows)]).astype(np.int64)
+
+    def _storage(self, shard_index, variable):
+        key = (shard_index, variable)
+        if key in self.storages:
+            self.storages.move_to_end(key)
+        else:
+            path = os.path.join(self.directory, self.shards[shard_index]["files"][variable])
+            self.storages[key] = PersistentStorage(path)
+            while len(self.storages) > self.cache_size * len(self.variables):
+                _, storage = self.storages.popitem(last=False)
+                storage.close()
+
+        return self.storages[key]
+
+    def _locate(self, indices):
+        return np.searchsorted(self.offsets, indices, side="right") - 1
+
+    def __getitem__(self, index):
+        if isinstance(index, (list, np.ndarray, torch.Tensor)):
+            return self.get_batch(index)
+        if index < 0:
+            index += len(self)
+        shard_index = int(self._locate(index))
+        local_index = index - int(self.offsets[shard_index])
+
+        return tuple(self._storage(shard_index, v)[local_index] for v in self.variables)
+
+    def get_batch(self, indices):
+        r"""Retrieves the rows at ``indices`` with one read per shard and variable."""
+        indices, inverse = sort_indices(indices)
+        shard_indices = self._locate(indices)
+        boundaries = np.flatnonzero(np.diff(shard_indices)) + 1
+        batches = {v: [] for v in self.variables}
+        for group in np.split(np.arange(len(indices)), boundaries):
+            if len(group) == 0:
+                continue
+            shard_index = int(shard_indices[group[0]])
+            local_indices = indices[group] - self.offsets[shard_index]
+            for v in self.variables:
+                batches[v].append(self._storage(shard_index, v)[local_indices])
+
+        batches = tuple(torch.cat(batches[v], dim=0) for v in self.variables)
+        # Restore the requested order.
+        if inverse is not None:
+            batches = tuple(x[inverse] for x in batches)
+
+        return batches
+
+    def close(self):
+        for storage in self.storages.values():
+            storage.close()
+        self.storages.clear()
+
+    def __del__(self):
+        if hasattr(self, "storages"):
+            self.close()
+
+    def __len__(self):
+        return int(self.offsets[-1])
@@ -4,7 +4,9 @@ import torch
 
 from torch.utils.data import Dataset
 from hypothesis.util.data.numpy import InMemoryStorage
-from hypothesis.util.data.numpy import PersistentStorage
+from hypothesis.util.data.numpy import allocate_storage
+from hypothesis.util.data.numpy.storage import compute_block_size
+from hypothesis.util.data.numpy.storage import sort_indices
 
 
 
@@ -13,12 +15,22 @@ class SimulationDataset(Dataset):
 
     def __init__(self, inputs, outputs, in_memory=False):
         super(SimulationDataset, self).__init__()
-        if in_memory:
-            self.storage_inputs = InMemoryStorage(inputs)
-            self.storage_outputs = InMemoryStorage(outputs)
-        else:
-            self.storage_inputs = PersistentStorage(inputs)
-            self.storage_outputs = PersistentStorage(outputs)
+        self.storage_inputs = allocate_storage(inputs, in_memory=in_memory)
+        self.storage_outputs = allocate_storage(outputs, in_memory=in_memory)
+
+    @property
+    def block_size(self):
+        r"""Number of contiguous rows to sample at once, or ``None``."""
+        return compute_block_size([self.storage_inputs, self.storage_outputs])
+
+    @property
+    def tensors(self):
+        r"""The inputs and outputs as tensors, or ``None`` when they are not
+        held in memory."""
+        if not isinstance(self.storage_inputs, InMemoryStorage) or not isinstance(self.storage_outputs, InMemoryStorage):
+            return None
+
+        return torch.from_numpy(self.storage_inputs.data), torch.from_numpy(self.storage_outputs.data)
 
     def __len__(self):
         return len(self.storage_inputs)
@@ -31,7 +43,20 @@ class SimulationDataset(Dataset):
 
     def __getitem__(self, index):
         r""""""
+        if isinstance(index, (list, np.ndarray, torch.Tensor)):
+            return self.get_batch(index)
         inputs = self.storage_inputs[index]
         outputs = self.storage_outputs[index]
 
         return inputs, outputs
+
+    def get_batch(self, indices):
+        r"""Retrieves the rows at ``indices`` with a single read per storage."""
+        indices, inverse = sort_indices(indices)
+        inputs = self.storage_inputs[indices]
+        outputs = self.storage_outputs[indices]
+        # Restore the requested order.
+        if inverse is not None:
+            inputs, outputs = inputs[inverse], outputs[inverse]
+
+        return inputs, outputs
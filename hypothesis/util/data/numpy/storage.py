@@ -1,6 +1,10 @@
+import json
 import numpy as np
 import os
 import torch
+import zipfile
+
+from collections import OrderedDict
 
 
 class BaseStorage:
@@ -38,10 +42,20 @@ class InMemoryStorage(BaseStorage):
         return len(self.data)
 
     def __getitem__(self, index):
-        return torch.from_numpy(self.data[index])
+        if torch.is_tensor(index):
+            index = index.numpy()
+
+        return torch.from_numpy(np.asarray(self.data[index]))
 
 
 class PersistentStorage(BaseStorage):
+    r"""Storage backed by a memory-map of the ``.npy`` file.
+
+    Rows are returned as tensors sharing memory with the (copy-on-write)
+    memory-map, i.e., integer and slice indices do not copy any data. Index
+    arrays (or lists and tensors) are retrieved with a single vectorized
+    gather, sorted index batches result in sequential reads.
+    """
 
     def __init__(self, path):
         super(PersistentStorage, self).__init__()
@@ -50,34 +64,49 @@ class PersistentStorage(BaseStorage):
             raise ValueError("The path", path, "does not exists.")
         # Storage properties.
         self.path = path
-        self.fd = open(self.path, "rb")
-        self.header, self.offset = self._parse_header(self.fd)
-        self.fd.close()
-        self.fd = None
+        with open(self.path, "rb") as fd:
+            self.header, self.offset = self._parse_header(fd)
+        self.data = None
         self.data_shape = self.header["shape"][1:]
         self.data_type = self.header["descr"]
         self.data_dimensionality = self._compute_dimensionality(self.data_shape)
-        self.data_bytes = int(self.data_type[-1]) * self.data_dimensionality
+        self.data_bytes = self.data_type.itemsize * self.data_dimensionality
         self.size = self.header["shape"][0]
 
+    def _open(self):
+        if self.data is None:
+            self.data = np.memmap(self.path,
+                dtype=self.data_type,
+                mode="c",
+                offset=self.offset,
+                shape=self.header["shape"],
+                order="F" if self.header["fortran_order"] else "C")
+
+        return self.data
+
     def _retrieve(self, index):
-        if self.fd is None:
-            self.fd = open(self.path, "rb")
-        self.fd.seek(self.offset + index * self.data_bytes)
-        data = np.fromfile(self.fd, dtype=self.data_type, count=self.data_dimensionality)
+        data = self._open()
+        if torch.is_tensor(index):
+            index = index.numpy()
+        elif isinstance(index, list):
+            index = np.asarray(index)
 
-        return data.reshape(self.data_shape)
+        return np.asarray(data[index])
 
     def close(self):
-        if hasattr(self, "fd") and self.fd is not None:
-            self.fd.close()
-        self.fd = None
+        if hasattr(self, "data") and self.data is not None:
+            del self.data
+        self.data = None
 
     def __getitem__(self, index):
-        return self._retrieve(index)
-        item = torch.from_numpy(data)
+        return torch.from_numpy(self._retrieve(index))
+
+    def __getstate__(self):
+        # Workers re-open the memory-map instead of receiving a copy of the data.
+        state = self.__dict__.copy()
+        state["data"] = None
 
-        return item
+        return state
 
     def __len__(self):
         return self.size
@@ -95,15 +124,179 @@ class PersistentStorage(BaseStorage):
         r"""
         Parses the ``numpy`` header of the specified file descriptor.
 
-        Note:
-            * The first 6 bytes are a magic string: exactly \x93NUMPY.
-            * The next 1 byte is an unsigned byte: the major version number of the file format, e.g. \x01.
-            * The next 1 byte is an unsigned byte: the minor version number of the file format, e.g. \x00. Note: the version of the file format is not tied to the version of the numpy package.
-            * The next 2 bytes form a little-endian unsigned short int: the length of the header data HEADER_LEN.
+        Returns the header (``shape``, ``fortran_order`` and ``descr``) and
+        the offset of the data in bytes.
         """
-        prefix = fd.read(10) # Read fixed header.
-        header_offset = int.from_bytes(prefix[-2:], byteorder="little")
-        header = eval(fd.read(header_offset)) # Not very secure but whatever.
-        header_offset += 10
+        version = np.lib.format.read_magic(fd)
+        if version == (1, 0):
+            shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(fd)
+        else:
+            shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(fd)
+        header = {
+            "descr": dtype,
+            "fortran_order": fortran_order,
+            "shape": shape}
+
+        return header, fd.tell()
+
+
+
+class CompressedStorage(BaseStorage):
+    r"""Storage backed by a chunked, compressed archive.
+
+    The archive (see ``hypothesis.util.data.numpy.compress``) is a zip file
+    of ``.npy`` chunks of ``chunk_size`` rows. Chunks holding binary values
+    are bit-packed. Chunks are decompressed on access, and the
+    ``cache_size`` most recently used chunks are kept in memory in their
+    (packed) form. Only the requested rows are unpacked. A ``cache_size`` of
+    ``None`` keeps all chunks.
+
+    Random access touching many chunks is costly, every chunk which is not
+    cached is decompressed as a whole. Sample contiguous blocks of
+    ``chunk_size`` rows instead, for instance with
+    ``hypothesis.util.data.BatchIndexSampler(block_size=storage.chunk_size)``.
+    The NumPy datasets expose this as their ``block_size``, which the
+    trainers use automatically.
+    """
+
+    METADATA = "metadata.json"
+
+    def __init__(self, path, cache_size=16):
+        super(CompressedStorage, self).__init__()
+        # Check if the specified path exists.
+        if path is None or not os.path.exists(path):
+            raise ValueError("The path", path, "does not exists.")
+        # Storage properties.
+        self.path = path
+        self.archive = None
+        self.cache = OrderedDict()
+        self.cache_size = cache_size
+        with zipfile.ZipFile(self.path) as archive:
+            metadata = json.loads(archive.read(self.METADATA).decode("utf-8"))
+        self.chunk_size = metadata["chunk_size"]
+        self.codecs = metadata["codecs"]
+        self.data_shape = tuple(metadata["shape"][1:])
+        self.data_type = np.dtype(metadata["dtype"])
+        self.data_dimensionality = PersistentStorage._compute_dimensionality(self.data_shape)
+        self.size = metadata["shape"][0]
+
+    @staticmethod
+    def chunk_name(index):
+        return "chunk-{:05d}.npy".format(index)
+
+    def _open(self):
+        if self.archive is None:
+            self.archive = zipfile.ZipFile(self.path)
+
+        return self.archive
+
+    def _chunk(self, index):
+        encoded = self.cache.get(index)
+        if encoded is not None:
+            self.cache.move_to_end(index)
+            return encoded
+        with self._open().open(self.chunk_name(index)) as fd:
+            encoded = np.lib.format.read_array(fd)
+        self.cache[index] = encoded
+        if self.cache_size is not None and len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+
+        return encoded
+
+    def _decode(self, index, rows):
+        encoded = self._chunk(index)[rows]
+        if self.codecs[index] == "bits":
+            data = np.unpackbits(encoded, axis=-1, count=self.data_dimensionality)
+        else:
+            data = encoded
+
+        return data.reshape(data.shape[:-1] + self.data_shape).astype(self.data_type, copy=False)
+
+    def _retrieve(self, index):
+        if torch.is_tensor(index):
+            index = index.numpy()
+        if isinstance(index, slice):
+            index = np.arange(*index.indices(self.size))
+        if np.isscalar(index):
+            index = int(index)
+            if not -self.size <= index < self.size:
+                raise IndexError("Index", index, "is out of bounds.")
+            chunk, offset = divmod(index % self.size, self.chunk_size)
+            return np.array(self._decode(chunk, offset))
+        indices = np.asarray(index, dtype=np.int64)
+        indices = np.where(indices < 0, indices + self.size, indices)
+        chunks = indices // self.chunk_size
+        data = np.empty(indices.shape + self.data_shape, dtype=self.data_type)
+        for chunk in np.unique(chunks):
+            mask = chunks == chunk
+            data[mask] = self._decode(int(chunk), indices[mask] - chunk * self.chunk_size)
+
+        return data
+
+    def close(self):
+        if hasattr(self, "archive") and self.archive is not None:
+            self.archive.close()
+        self.archive = None
+        self.cache = OrderedDict()
+
+    def __getitem__(self, index):
+        return torch.from_numpy(self._retrieve(index))
+
+    def __getstate__(self):
+        # Workers re-open the archive and maintain their own cache.
+        state = self.__dict__.copy()
+        state["archive"] = None
+        state["cache"] = OrderedDict()
+
+        return state
+
+    def __len__(self):
+        return self.size
+
+
+def allocate_storage(path, in_memory=False):
+    r"""Allocates the storage matching the extension of ``path``.
+
+    All chunks of compressed archives (``.npz``) are kept in memory when
+    ``in_memory`` is set.
+    """
+    if str(path).endswith(".npz"):
+        return CompressedStorage(path, cache_size=None if in_memory else 16)
+    elif in_memory:
+        return InMemoryStorage(path)
+    else:
+        return PersistentStorage(path)
+
+
+def compute_block_size(storages):
+    r"""Number of contiguous rows to sample at once from ``storages``.
+
+    Random rows of a ``CompressedStorage`` which does not cache all its
+    chunks decompress a chunk each. Blocks aligned to the chunks of all
+    storages decompress every chunk once. Returns ``None`` if none of the
+    storages benefits from blocks.
+    """
+    block_size = None
+    for storage in storages:
+        if isinstance(storage, CompressedStorage) and storage.cache_size is not None:
+            chunk_size = int(storage.chunk_size)
+            if block_size is None:
+                block_size = chunk_size
+            else:
+                block_size = int(np.lcm(block_size, chunk_size))
+
+    return block_size
+
+
+def sort_indices(indices):
+    r"""Sorts ``indices`` such that the storages are read front to back.
+
+    Returns the sorted indices and the permutation restoring the requested
+    order of the retrieved rows, or ``None`` if ``indices`` is sorted.
+    """
+    indices = np.asarray(indices).reshape(-1)
+    if np.all(indices[:-1] <= indices[1:]):
+        return indices, None
+    order = np.argsort(indices, kind="stable")
 
-        return header, header_offset
+    return indices[order], torch.from_numpy(np.argsort(order))
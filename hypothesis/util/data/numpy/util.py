@@ -1,29 +1,57 @@
 import glob
+import json
 import numpy as np
 import os
-import tempfile as temp
 import torch
+import zipfile
 
+from hypothesis.util.data.numpy.storage import CompressedStorage
+from multiprocessing import Pool
+
+
+
+def read_header(path):
+    r"""Reads the shape, memory order and dtype of a ``.npy`` file without
+    loading its data."""
+    with open(path, "rb") as fd:
+        version = np.lib.format.read_magic(fd)
+        if version == (1, 0):
+            shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(fd)
+        else:
+            shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(fd)
+
+    return shape, fortran_order, dtype
 
 
 def compute_final_shape(file_names, axis=0):
-    num_files = len(file_names)
-    shape = list(np.load(file_names[0]).shape)
-    shape[axis] *= num_files
+    shapes = [list(read_header(file_name)[0]) for file_name in file_names]
+    shape = shapes[0]
+    for other in shapes[1:]:
+        if other[:axis] + other[axis + 1:] != shape[:axis] + shape[axis + 1:]:
+            raise ValueError("The shapes", shape, "and", other, "cannot be merged in dimension", axis)
+    shape[axis] = sum(other[axis] for other in shapes)
 
     return tuple(shape)
 
 
-def merge(input_files, output_file, tempfile=None, dtype=None, in_memory=False, axis=0):
+def merge(input_files, output_file, tempfile=None, dtype=None, in_memory=False, axis=0, workers=1, chunk_bytes=1 << 26):
+    r"""Merges the ``.npy`` input files along ``axis``.
+
+    Only the headers of the input files are read to plan the output. The
+    data is streamed into the final file in chunks of at most
+    ``chunk_bytes``, optionally by multiple ``workers`` writing their input
+    files at distinct offsets. The ``tempfile`` argument is no longer
+    required and only kept for compatibility.
+    """
     # Compute the shape of the final data file.
     shape = compute_final_shape(input_files, axis=axis)
     # Check if a dtype needs to be derived.
     if dtype is None:
-        dtype = np.load(input_files[0]).dtype
+        dtype = read_header(input_files[0])[2]
     if in_memory:
         merge_in_memory(input_files, output_file, shape=shape, dtype=dtype, axis=axis)
     else:
-        merge_on_disk(input_files, output_file, shape=shape, dtype=dtype, axis=axis, tempfile=tempfile)
+        merge_on_disk(input_files, output_file, shape=shape, dtype=dtype, axis=axis, workers=workers, chunk_bytes=chunk_bytes)
 
 
 def merge_in_memory(input_files, output_file, shape, dtype=None, axis=0):
@@ -32,22 +60,136 @@ def merge_in_memory(input_files, output_file, shape, dtype=None, axis=0):
     np.save(output_file, datamap)
 
 
-def merge_on_disk(input_files, output_file, shape, dtype=None, axis=0, tempfile=None):
-    # Check if a random temporary file needs to be allocated.
-    if tempfile is None:
-        _, tempfile = temp.mkstemp(dir='.')
-    datamap = np.memmap(tempfile, dtype=dtype, mode="w+", shape=shape)
-    insert_data(input_files, datamap, axis=axis)
-    np.save(output_file, datamap)
-    os.remove(tempfile)
+def merge_on_disk(input_files, output_file, shape, dtype=None, axis=0, tempfile=None, workers=1, chunk_bytes=1 << 26):
+    # Write the header and allocate the final file.
+    datamap = np.lib.format.open_memmap(output_file, mode="w+", dtype=dtype, shape=shape)
+    del datamap
+    # Determine the offset of every input file in the merge dimension.
+    offsets = np.cumsum([0] + [read_header(f)[0][axis] for f in input_files])
+    arguments = [(f, output_file, axis, int(offset), chunk_bytes) for f, offset in zip(input_files, offsets)]
+    if workers > 1:
+        with Pool(processes=workers) as pool:
+            pool.map(_insert_file, arguments)
+    else:
+        for argument in arguments:
+            _insert_file(argument)
+
+
+def _insert_file(arguments):
+    input_file, output_file, axis, offset, chunk_bytes = arguments
+    datamap = np.load(output_file, mmap_mode="r+")
+    insert_file(input_file, datamap, offset=offset, axis=axis, chunk_bytes=chunk_bytes)
+    datamap.flush()
+    del datamap
+
+
+def insert_file(input_file, datamap, offset=0, axis=0, chunk_bytes=1 << 26):
+    r"""Streams ``input_file`` into ``datamap`` at ``offset`` along ``axis``,
+    reading at most ``chunk_bytes`` at a time."""
+    data = np.load(input_file, mmap_mode="r")
+    num_rows = data.shape[0]
+    row_bytes = max(1, data[:1].nbytes)
+    chunk_rows = max(1, chunk_bytes // row_bytes)
+    for base in range(0, num_rows, chunk_rows):
+        chunk = data[base:base + chunk_rows]
+        index = [slice(None)] * datamap.ndim
+        if axis == 0:
+            index[0] = slice(offset + base, offset + base + len(chunk))
+        else:
+            index[0] = slice(base, base + len(chunk))
+            index[axis] = slice(offset, offset + data.shape[axis])
+        datamap[tuple(index)] = chunk
+    del data
 
 
 def insert_data(input_files, datamap, axis=0):
-    index = 0
-    if axis > 0:
-        datamap = np.rollaxis(datamap, axis)
+    offset = 0
     for file_name in input_files:
-        data = np.load(file_name)
-        num_rows = data.shape[0]
-        datamap[index:index + num_rows, :] = data
-        index += num_rows
+        insert_file(file_name, datamap, offset=offset, axis=axis)
+        offset += read_header(file_name)[0][axis]
+
+
+def prune(input_file, output_file, indices=None, mask=None, axis=0, in_memory=False, chunk_bytes=1 << 26):
+    r"""Removes the specified entries along ``axis`` from ``input_file``.
+
+    The entries to remove are given by ``indices`` (integers or slices)
+    and/or a boolean ``mask`` (``True`` marks an entry for removal). Unless
+    ``in_memory`` is set, the input is memory-mapped and streamed into the
+    output file in chunks of at most ``chunk_bytes``.
+
+    Returns the number of remaining entries along ``axis``.
+    """
+    if in_memory:
+        data = np.load(input_file)
+    else:
+        data = np.load(input_file, mmap_mode="r")
+    keep = np.ones(data.shape[axis], dtype=bool)
+    if indices is not None:
+        for index in indices:
+            keep[index] = False
+    if mask is not None:
+        keep &= ~np.asarray(mask, dtype=bool)
+    shape = list(data.shape)
+    shape[axis] = int(keep.sum())
+    datamap = np.lib.format.open_memmap(output_file, mode="w+", dtype=data.dtype, shape=tuple(shape))
+    num_rows = data.shape[0]
+    row_bytes = max(1, data[:1].nbytes)
+    chunk_rows = max(1, chunk_bytes // row_bytes)
+    offset = 0
+    for base in range(0, num_rows, chunk_rows):
+        chunk = data[base:base + chunk_rows]
+        if axis == 0:
+            chunk = chunk[keep[base:base + chunk_rows]]
+        else:
+            chunk = np.compress(keep, chunk, axis=axis)
+        datamap[offset:offset + len(chunk)] = chunk
+        offset += len(chunk)
+    datamap.flush()
+    del datamap
+    del data
+
+    return shape[axis]
+
+
+def compress(input_file, output_file, chunk_size=1024, codec=None, compression=True):
+    r"""Converts a ``.npy`` file into a chunked archive for ``CompressedStorage``.
+
+    The rows of ``input_file`` are stored in chunks of ``chunk_size`` rows.
+    The ``codec`` of a chunk is either ``"bits"`` (bit-packed, requires
+    binary values) or ``"raw"``. By default, every chunk is bit-packed
+    whenever its values are binary. With ``compression``, the chunks are
+    additionally deflated.
+
+    Returns the ratio between the size of the input and output files.
+    """
+    if codec not in (None, "bits", "raw"):
+        raise ValueError("Unknown codec", codec, ", available options: bits, raw.")
+    data = np.load(input_file, mmap_mode="r")
+    codecs = []
+    mode = zipfile.ZIP_DEFLATED if compression else zipfile.ZIP_STORED
+    temporary_file = output_file + ".tmp"
+    with zipfile.ZipFile(temporary_file, "w", compression=mode, allowZip64=True) as archive:
+        for index, base in enumerate(range(0, len(data), chunk_size)):
+            chunk = np.asarray(data[base:base + chunk_size])
+            chunk = chunk.reshape(len(chunk), -1)
+            binary = np.all((chunk == 0) | (chunk == 1))
+            chunk_codec = codec
+            if chunk_codec is None:
+                chunk_codec = "bits" if binary else "raw"
+            if chunk_codec == "bits":
+                if not binary:
+                    raise ValueError("Chunk", index, "contains non-binary values.")
+                chunk = np.packbits(chunk.astype(np.bool_), axis=1)
+            with archive.open(CompressedStorage.chunk_name(index), "w", force_zip64=True) as fd:
+                np.lib.format.write_array(fd, np.ascontiguousarray(chunk))
+            codecs.append(chunk_codec)
+        metadata = {
+            "chunk_size": chunk_size,
+            "codecs": codecs,
+            "dtype": data.dtype.str,
+            "shape": list(data.shape)}
+        archive.writestr(CompressedStorage.METADATA, json.dumps(metadata))
+    os.replace(temporary_file, output_file)
+    del data
+
+    return os.path.getsize(input_file) / os.path.getsize(output_file)
@@ -0,0 +1,50 @@
+import numpy as np
+import torch
+
+from torch.utils.data import Sampler
+
+
+
+class BatchIndexSampler(Sampler):
+    r"""Samples complete batches of indices at once.
+
+    Intended for datasets implementing ``get_batch``, which retrieve a whole
+    batch in a single call. Every batch is sorted, such that memory-mapped
+    storages are read front to back. Setting ``block_size`` shuffles
+    contiguous blocks of rows instead of individual rows, trading
+    randomness for sequential reads.
+
+    Use with ``DataLoader(dataset, sampler=sampler, batch_size=None)``.
+    """
+
+    def __init__(self, size, batch_size, shuffle=True, drop_last=True, block_size=None):
+        self.batch_size = int(batch_size)
+        self.block_size = block_size
+        self.drop_last = drop_last
+        self.shuffle = shuffle
+        self.size = int(size)
+
+    def _permutation(self):
+        if not self.shuffle:
+            return np.arange(self.size)
+        if self.block_size is None:
+            return torch.randperm(self.size).numpy()
+        # Permute contiguous blocks of rows.
+        block_size = int(self.block_size)
+        num_blocks = -(-self.size // block_size)
+        blocks = torch.randperm(num_blocks).numpy()
+        indices = (blocks.reshape(-1, 1) * block_size + np.arange(block_size).reshape(1, -1)).reshape(-1)
+
+        return indices[indices < self.size]
+
+    def __iter__(self):
+        indices = self._permutation()
+        for index in range(len(self)):
+            batch = indices[index * self.batch_size:(index + 1) * self.batch_size]
+            yield np.sort(batch)
+
+    def __len__(self):
+        if self.drop_last:
+            return self.size // self.batch_size
+        else:
+            return -(-self.size // self.batch_size)
@@ -15,5 +15,9 @@ class SimulationTensorDataset(Dataset):
     def __getitem__(self, index):
         return self.inputs[index], self.outputs[index]
 
+    @property
+    def tensors(self):
+        return self.inputs, self.outputs
+
     def __len__(self):
         return self.inputs.shape[0]
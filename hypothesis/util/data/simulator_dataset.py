@@ -8,6 +8,12 @@ from torch.utils.data import Dataset
 class SimulatorDataset(Dataset):
     r"""
 
+    Note:
+        When loaded by multiple ``DataLoader`` workers, pass
+        ``worker_init_fn=hypothesis.util.seed_dataloader_worker`` to give
+        every worker an independent (and reproducible) random stream. The
+        trainers in ``hypothesis.auto.training`` do this by default.
+
     Todo:
         Write docs.
     """
@@ -0,0 +1,72 @@
+r"""Utilities to derive independent random streams for parallel workers.
+
+Forked workers inherit the random state of their parent, which results in
+duplicated simulations. The utilities below derive statistically independent
+streams through ``numpy.random.SeedSequence``. Given a root seed, the
+derived streams (and therefore the simulations) are reproducible.
+"""
+
+import numpy as np
+import random
+import torch
+
+from numpy.random import SeedSequence
+
+
+
+def spawn_seeds(seed, n):
+    r"""Derives ``n`` independent seed sequences from ``seed``.
+
+    ``seed`` can be an integer, a ``SeedSequence`` or ``None`` (fresh
+    entropy from the operating system).
+    """
+    if not isinstance(seed, SeedSequence):
+        seed = SeedSequence(seed)
+
+    return seed.spawn(n)
+
+
+def seed_process(seed=None):
+    r"""Seeds the Python, NumPy and PyTorch generators of the current process.
+
+    ``seed`` can be an integer, a ``SeedSequence`` or ``None`` (fresh
+    entropy from the operating system).
+    """
+    if not isinstance(seed, SeedSequence):
+        seed = SeedSequence(seed)
+    state = seed.generate_state(4, dtype=np.uint32)
+    random.seed(int.from_bytes(state.tobytes(), byteorder="little"))
+    np.random.seed(state)
+    torch.manual_seed((int(state[0]) << 32) | int(state[1]))
+
+
+def seed_dataloader_worker(worker_id):
+    r"""``worker_init_fn`` for ``torch.utils.data.DataLoader``.
+
+    PyTorch already assigns every worker a distinct torch seed (derived from
+    the generator of the main process), but leaves the NumPy and Python
+    generators in their forked state. This derives all of them from the
+    torch seed of the worker.
+    """
+    seed_process(SeedSequence([torch.initial_seed() % 2 ** 32, worker_id]))
+
+
+def get_rng_state():
+    r"""Returns the states of the Python, NumPy and PyTorch generators."""
+    state = {
+        "python": random.getstate(),
+        "numpy": np.random.get_state(),
+        "torch": torch.get_rng_state()}
+    if torch.cuda.is_available():
+        state["cuda"] = torch.cuda.get_rng_state_all()
+
+    return state
+
+
+def set_rng_state(state):
+    r"""Restores the generator states obtained through ``get_rng_state``."""
+    random.setstate(state["python"])
+    np.random.set_state(state["numpy"])
+    torch.set_rng_state(state["torch"])
+    if "cuda" in state and torch.cuda.is_available():
+        torch.cuda.set_rng_state_all(state["cuda"])